@@ -0,0 +1,118 @@
+import os
+import sys
+
+# Прогін тисяч ігор бота на всіх ядрах, по одному seed на гру, і зведення по висоті,
+# причині смерті та монетах. Запуск:
+#   python batch.py [ігор] [--frames N] [--workers N] [--policy wall_kick] [--seed S]
+#                   [--gap 180,220] [--spike 0.3] [--moving 0.35] [--coin 0.3] [--json файл]
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import json
+import multiprocessing
+from time import perf_counter
+
+import main
+from main import option
+
+HEIGHT_BUCKET = 50  # метрів на стовпчик гістограми
+
+
+# Параметри генератора, які перевизначаються для всіх ігор партії
+def tuning_from_argv():
+    tuning = {}
+    if "--gap" in sys.argv:
+        tuning["WALL_GAP"] = tuple(int(v) for v in option("--gap", "").split(","))
+    for flag, name in [("--spike", "SPIKE_CHANCE"), ("--moving", "MOVING_CHANCE"), ("--coin", "COIN_CHANCE")]:
+        if flag in sys.argv:
+            tuning[name] = option(flag, 0.0, float)
+    return tuning
+
+
+# pygame.init() у воркерах не викликаємо: SDL перехоплює SIGTERM/SIGINT,
+# і пул не зміг би їх зупинити. Фізиці й генератору ініціалізація не потрібна
+def init_worker(tuning):
+    for name, value in tuning.items():
+        setattr(main, name, value)
+
+
+def play(task):
+    seed, frames, policy = task
+    world = main.run_headless(frames, main.POLICIES[policy], seed=seed)
+    cause = world.state if world.state != "PLAYING" else "TIMEOUT"
+    return {"seed": seed, "height": world.score // 10, "cause": cause,
+            "coins": world.stats['coins'], "frames": world.frame}
+
+
+def percentile(values, q):
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def summarize(results):
+    heights = sorted(r["height"] for r in results)
+    coins = sorted(r["coins"] for r in results)
+    causes = {}
+    for r in results:
+        causes[r["cause"]] = causes.get(r["cause"], 0) + 1
+    buckets = {}
+    for h in heights:
+        b = h // HEIGHT_BUCKET * HEIGHT_BUCKET
+        buckets[b] = buckets.get(b, 0) + 1
+    return {
+        "games": len(results),
+        "frames": sum(r["frames"] for r in results),
+        "height": {"mean": sum(heights) / len(heights), "p50": percentile(heights, 0.5),
+                   "p90": percentile(heights, 0.9), "max": heights[-1]},
+        "coins": {"mean": sum(coins) / len(coins), "p50": percentile(coins, 0.5),
+                  "p90": percentile(coins, 0.9), "max": coins[-1]},
+        "causes": causes,
+        "height_histogram": buckets,
+    }
+
+
+def report(summary, elapsed):
+    games = summary["games"]
+    print(f"{games} games, {summary['frames']} frames in {elapsed:.1f} s "
+          f"({summary['frames'] / elapsed:.0f} frames/s)")
+    for key in ("height", "coins"):
+        s = summary[key]
+        unit = "m" if key == "height" else ""
+        print(f"{key:<7} mean {s['mean']:.1f}{unit}  p50 {s['p50']}{unit}  p90 {s['p90']}{unit}  max {s['max']}{unit}")
+    print("death   " + "  ".join(f"{cause} {count * 100 / games:.1f}%"
+                                 for cause, count in sorted(summary["causes"].items())))
+    top = max(summary["height_histogram"].values())
+    for bucket, count in sorted(summary["height_histogram"].items()):
+        bar = "#" * max(1, count * 40 // top)
+        print(f"{bucket:>6}-{bucket + HEIGHT_BUCKET - 1:<6}m {count:>6} {bar}")
+
+
+def run():
+    args = [a for a in sys.argv[1:2] if a.isdigit()]
+    games = int(args[0]) if args else 1000
+    frames = option("--frames", 20000, int)
+    workers = option("--workers", os.cpu_count() or 1, int)
+    policy = option("--policy", "wall_kick")
+    first_seed = option("--seed", 0, int)
+    tuning = tuning_from_argv()
+    if policy not in main.POLICIES:
+        print(f"unknown policy {policy}, expected one of: {', '.join(main.POLICIES)}")
+        return 1
+
+    tasks = [(seed, frames, policy) for seed in range(first_seed, first_seed + games)]
+    started = perf_counter()
+    with multiprocessing.Pool(workers, init_worker, (tuning,)) as pool:
+        results = list(pool.imap_unordered(play, tasks, chunksize=max(1, games // (workers * 8))))
+    elapsed = perf_counter() - started
+
+    summary = summarize(results)
+    summary["tuning"] = tuning
+    report(summary, elapsed)
+    path = option("--json", None)
+    if path:
+        with open(path, "w") as f:
+            json.dump({"summary": summary, "games": sorted(results, key=lambda r: r["seed"])}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
@@ -0,0 +1,345 @@
+import os
+import sys
+
+# Бенчмарки гарячих місць гри без вікна (SDL dummy).
+# Запуск: python bench.py [--save] [--threshold 0.15] [--runs 5]
+# --save записує поточні результати як базу, інакше порівнює з bench_baseline.json.
+# Кожен бенчмарк проганяється --runs разів після прогону на розігрів. База - медіана
+# прогонів, а порівнюється найкращий поточний: шум лише сповільнює, тож регресія -
+# це коли навіть найшвидший прогін повільніший за звичайний прогін бази. Підозрілі
+# бенчмарки переміряються ще раз і потрапляють у звіт, лише якщо регресія відтворилась
+# --check замість замірів звіряє PlayerBatch зі скалярним Player і падає на першій розбіжності
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import json
+import random
+import statistics
+from time import perf_counter_ns
+from pygame import display
+
+import main
+from main import HEIGHT, PHYSICS_DT, World, LevelGenerator, Hud, get_font, draw_hud, wall_kick_policy, option
+
+BASELINE = "bench_baseline.json"
+THRESHOLD = option("--threshold", 0.15, float)
+# Малювання через SDL впирається в пам'ять і на спільній машині гуляє в півтора раза
+# разом із сусідами, тож ловимо лише грубі регресії; чистий Python шумить менше
+THRESHOLDS = {
+    "player_update": max(THRESHOLD, 0.25),
+    "particles_draw": max(THRESHOLD, 0.5),
+    "hud_render": max(THRESHOLD, 0.5),
+    "full_frame": max(THRESHOLD, 0.5),
+}
+MIN_DELTA = 0.5  # us; повільніше менш ніж на стільки - не регресія, хоч би який відсоток
+RUNS = option("--runs", 5, int)
+WARMUP_RUNS = 1
+SEEDS = range(8)
+FRAMES = 3000  # кроків фізики на одну гру
+
+
+def new_stats():
+    return {"best": 0, "coins": 0}
+
+
+# Обгортка, що пише тривалість кожного виклику в samples (наносекунди)
+def timed(samples, fn):
+    def wrapper(*args, **kwargs):
+        start = perf_counter_ns()
+        result = fn(*args, **kwargs)
+        samples.append(perf_counter_ns() - start)
+        return result
+    return wrapper
+
+
+# Бот грає, поки не впаде; після смерті - одразу відроджується, щоб гра йшла FRAMES кроків
+def play(world, frames=FRAMES, each_frame=None):
+    for _ in range(frames):
+        if world.step(wall_kick_policy(world)) != "PLAYING":
+            world.revive(cost=0)
+        if each_frame:
+            each_frame(world)
+
+
+def bench_player_update():
+    samples = []
+    for seed in SEEDS:
+        world = World(new_stats(), seed)
+        world.player.update = timed(samples, world.player.update)
+        play(world)
+    return samples
+
+
+# Генератор рівня окремо від гри: стіни над "камерою", що піднімається на екран за раз
+def run_generator(patch):
+    samples = []
+    for seed in SEEDS:
+        gen = LevelGenerator(seed)
+        patch(gen, samples)
+        camera_y = 0
+        for _ in range(200):
+            camera_y -= HEIGHT
+            gen.generate(camera_y - HEIGHT)
+            gen.zones.prune_below(camera_y + HEIGHT)
+    return samples
+
+
+def bench_overlap():
+    def patch(gen, samples):
+        gen.overlaps = timed(samples, gen.overlaps)
+    return run_generator(patch)
+
+
+def bench_next_wall():
+    def patch(gen, samples):
+        gen.next_wall = timed(samples, gen.next_wall)
+    return run_generator(patch)
+
+
+def bench_particles(stage):
+    samples = []
+    rng = random.Random(0)
+    pool = main.particles
+    pool.clear()
+    screen = main.app.start()
+    update = timed(samples, pool.update) if stage == "update" else pool.update
+    draw = timed(samples, pool.draw) if stage == "draw" else pool.draw
+    for frame in range(FRAMES):
+        # Як у грі: сплески по 5-15 частинок при стрибках
+        if frame % 4 == 0:
+            pool.emit(rng.randint(0, 450), rng.randint(0, HEIGHT), (255, 255, 255), rng.randint(5, 15))
+        update()
+        draw(screen, 0.5, 0)
+    pool.clear()
+    return samples
+
+
+def bench_hud():
+    samples = []
+    screen = main.app.start()
+    hud = Hud(get_font("Arial", 25, bold=True))
+    stats = new_stats()
+    render = timed(samples, draw_hud)
+    # Гравець піднімається ~3 px за крок, тож текст висоти змінюється кожні кілька кадрів
+    for frame in range(FRAMES * 4):
+        if frame % 97 == 0:
+            stats['coins'] += 1
+        render(screen, hud, frame * 3, stats)
+    return samples
+
+
+def bench_frame():
+    samples = []
+    screen = main.app.start()
+    hud = Hud(get_font("Arial", 25, bold=True))
+
+    def frame(world):
+        start = perf_counter_ns()
+        world.draw(screen, 0.5)
+        draw_hud(screen, hud, world.score, world.stats)
+        display.flip()
+        samples.append(perf_counter_ns() - start)
+
+    for seed in SEEDS[:2]:
+        world = World(new_stats(), seed)
+        world.step = timed(samples, world.step)
+        play(world, FRAMES, frame)
+    # step і малювання записані окремо - складаємо їх парами в один кадр
+    return [samples[i] + samples[i + 1] for i in range(0, len(samples) - 1, 2)]
+
+
+BENCHMARKS = {
+    "player_update": bench_player_update,
+    "overlap_check": bench_overlap,
+    "wall_generation": bench_next_wall,
+    "particles_update": lambda: bench_particles("update"),
+    "particles_draw": lambda: bench_particles("draw"),
+    "hud_render": bench_hud,
+    "full_frame": bench_frame,
+}
+
+
+# --- CHECK ---
+CHECK_SEEDS = range(40)
+CHECK_RANDOM = (300, 400)  # гравців і кроків у перевірці випадкових послідовностей
+
+
+def player_state(p):
+    return (p.rect.x, p.rect.y, p.vel_x, p.vel_y, main.WALL_SIDES[p.on_wall], p.facing_right,
+            p.jumps_left, p.on_ground, p.is_flying)
+
+
+def batch_state(b, i):
+    return (b.x[i], b.y[i], b.vel_x[i], b.vel_y[i], b.on_wall[i], b.facing_right[i],
+            b.jumps_left[i], b.on_ground[i], b.is_flying[i])
+
+
+def same_state(p, b, i):
+    return tuple(map(float, player_state(p))) == tuple(map(float, batch_state(b, i)))
+
+
+# Гравець у справжньому світі (рухомі стіни, випадкові натискання, джетпак) і його
+# копія в PlayerBatch(1) на знімку тих самих стін після кожного кроку
+def check_world(seed):
+    rng = random.Random(seed)
+    world = World(new_stats(), seed)
+    player = world.player
+    batch = main.PlayerBatch(1, player)
+    mismatch = []
+    prev = [None]
+    update, jump = player.update, player.jump
+
+    def checked_update(inputs, platforms, score):
+        walls = main.WallSet(platforms)
+        # Індекс стіни, до якої прилип гравець, переносимо на новий знімок
+        if prev[0] is not None and batch.attached[0] >= 0:
+            wall = prev[0].walls[batch.attached[0]]
+            batch.attached[0] = walls.walls.index(wall) if wall in walls.walls else -1
+        prev[0] = walls
+        batch.update(inputs, walls, score)
+        update(inputs, platforms, score)
+        if not mismatch and not same_state(player, batch, 0):
+            mismatch.append((world.frame, player_state(player), batch_state(batch, 0)))
+
+    def checked_jump():
+        batch.jump(True)
+        return jump()
+
+    player.update, player.jump = checked_update, checked_jump
+    for frame in range(FRAMES):
+        if world.state != "PLAYING" or mismatch:
+            break
+        inputs = wall_kick_policy(world) if rng.random() > 0.2 else rng.randrange(32)
+        if frame == 500 and seed % 3 == 0:
+            player.activate_jetpack(world.score)
+            batch.is_flying[0] = True
+            batch.fly_target_height[0] = world.score + 2500
+            batch.vel_y[0] = -15
+            batch.on_wall[0] = 0
+        world.step(inputs)
+    return world.frame, mismatch
+
+
+# Багато гравців з випадковими входами проти одного нерухомого набору стін
+def check_random(seed):
+    world = World(new_stats(), seed)
+    walls = main.WallSet(world.platforms)
+    count, steps = CHECK_RANDOM
+    rng = main.np.random.default_rng(seed)
+    inputs = rng.integers(0, 32, size=(steps, count))
+    players = [main.Player() for _ in range(count)]
+    batch = main.PlayerBatch(count)
+    for t in range(steps):
+        batch.step(inputs[t], walls)
+        for i, p in enumerate(players):
+            if inputs[t, i] & main.IN_JUMP:
+                p.jump()
+            p.update(int(inputs[t, i]), world.platforms, 0)
+            if not same_state(p, batch, i):
+                return count * steps, [(t, player_state(p), batch_state(batch, i))]
+    return count * steps, []
+
+
+def check():
+    if main.np is None:
+        print("--check needs numpy")
+        return 1
+    main.init()
+    steps = 0
+    for name, fn, seeds in [("world", check_world, CHECK_SEEDS), ("random", check_random, CHECK_SEEDS[:2])]:
+        for seed in seeds:
+            n, mismatch = fn(seed)
+            steps += n
+            if mismatch:
+                frame, scalar, batch = mismatch[0]
+                print(f"MISMATCH {name} seed {seed} step {frame}:\n  Player      {scalar}\n  PlayerBatch {batch}")
+                return 1
+    print(f"PlayerBatch matches Player over {steps} player-steps")
+    return 0
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    n = len(samples)
+    return {
+        "calls": n,
+        "mean": sum(samples) / n / 1000,
+        "p50": samples[n // 2] / 1000,
+        "p95": samples[min(n - 1, n * 95 // 100)] / 1000,
+        "p99": samples[min(n - 1, n * 99 // 100)] / 1000,
+    }
+
+
+# Бенчмарки йдуть по колу, а не кожен RUNS разів поспіль, щоб фоновий шум
+# машини розподілився між ними, а не зіпсував один
+def measure(names=BENCHMARKS, warmup=WARMUP_RUNS):
+    runs = {name: [] for name in names}
+    for i in range(warmup + RUNS):
+        for name in names:
+            res = summarize(BENCHMARKS[name]())
+            if i >= warmup:
+                runs[name].append(res)
+    return runs
+
+
+def combine(runs, how):
+    return {name: {key: how([r[key] for r in rs]) for key in rs[0]} for name, rs in runs.items()}
+
+
+def compare(results, baseline):
+    regressions = {}
+    for name, res in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        threshold = THRESHOLDS.get(name, THRESHOLD)
+        for key in ("p50", "p95"):
+            if res[key] > base[key] * (1 + threshold) and res[key] - base[key] > MIN_DELTA:
+                regressions.setdefault(name, []).append(
+                    f"{name} {key}: {base[key]:.1f} -> {res[key]:.1f} us (+{(res[key] / base[key] - 1) * 100:.0f}%)")
+    return regressions
+
+
+def run():
+    main.app.start()
+    runs = measure()
+    results = combine(runs, min)
+    print(f"best of {RUNS} runs")
+    print(f"{'benchmark':<18}{'calls':>8}{'mean us':>10}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for name, res in results.items():
+        print(f"{name:<18}{res['calls']:>8}{res['mean']:>10.1f}{res['p50']:>10.1f}{res['p95']:>10.1f}{res['p99']:>10.1f}")
+
+    frame = results["full_frame"]
+    budget = PHYSICS_DT * 1000
+    print(f"full frame: {1e6 / frame['mean']:.0f} FPS, p99 uses {frame['p99'] / budget * 100:.1f}% "
+          f"of the {PHYSICS_DT:.1f} ms budget")
+
+    if "--save" in sys.argv:
+        with open(BASELINE, "w") as f:
+            json.dump(combine(runs, statistics.median), f, indent=2)
+        print(f"baseline (median of {RUNS} runs) saved to {BASELINE}")
+        return 0
+
+    if not os.path.exists(BASELINE):
+        print(f"no {BASELINE}, run with --save to create one")
+        return 0
+    with open(BASELINE) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline)
+    # Повільне вікно машини буває довшим за всі прогони одного бенчмарку:
+    # справжня регресія відтвориться і в повторному замірі, шум - навряд
+    if regressions:
+        print(f"re-measuring {', '.join(regressions)}")
+        for name, extra in measure(list(regressions), warmup=0).items():
+            runs[name] += extra
+        regressions = compare(combine({name: runs[name] for name in regressions}, min), baseline)
+    for lines in regressions.values():
+        for line in lines:
+            print("REGRESSION", line)
+    if not regressions:
+        print("no regressions")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(check() if "--check" in sys.argv else run())
@@ -0,0 +1,81 @@
+import os
+import sys
+
+# Збирає assets.pack: усі спрайти з SPRITES, вже зменшені до ігрового розміру,
+# в одному RGBA-атласі. Запуск: python build_assets.py
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import json
+import struct
+from pygame import image, transform
+
+from main import ASSET_PACK, ASSET_PACK_MAGIC, SPRITES, find_image
+
+ATLAS_WIDTH = 256
+
+
+def load_sources():
+    sprites = {}
+    for name, (file, _, _, size, alpha) in SPRITES.items():
+        path = find_image(file)
+        if path is None:
+            print(f"skip {name}: {file} not found")
+            continue
+        img = image.load(path)
+        # Збільшувати наперед немає сенсу - пак лише виросте, тож такі спрайти
+        # лишаються в початковому розмірі і масштабуються при завантаженні
+        src_w, src_h = img.get_size()
+        if size[0] * size[1] < src_w * src_h:
+            img = transform.scale(img, size)
+        sprites[name] = (img, alpha)
+    return sprites
+
+
+# Проста полична упаковка: від найвищих спрайтів до найнижчих
+def pack_rects(sprites):
+    width = max([ATLAS_WIDTH] + [img.get_width() for img, _ in sprites.values()])
+    rects = {}
+    x = y = shelf_h = 0
+    for name in sorted(sprites, key=lambda n: sprites[n][0].get_height(), reverse=True):
+        w, h = sprites[name][0].get_size()
+        if x + w > width:
+            x, y = 0, y + shelf_h
+            shelf_h = 0
+        rects[name] = [x, y, w, h]
+        x += w
+        shelf_h = max(shelf_h, h)
+    return (width, y + shelf_h), rects
+
+
+def build(path=ASSET_PACK):
+    sprites = load_sources()
+    (atlas_w, atlas_h), rects = pack_rects(sprites)
+
+    atlas = bytearray(atlas_w * atlas_h * 4)
+    for name, (x, y, w, h) in rects.items():
+        pixels = image.tobytes(sprites[name][0], "RGBA")
+        for row in range(h):
+            start = ((y + row) * atlas_w + x) * 4
+            atlas[start:start + w * 4] = pixels[row * w * 4:(row + 1) * w * 4]
+
+    header = json.dumps({
+        "size": [atlas_w, atlas_h],
+        "assets": {name: {"rect": rects[name], "alpha": sprites[name][1]} for name in rects},
+    }).encode()
+
+    # Як StatsStore.write: обірвана збірка не лишає обрізаного паку, на якому впаде гра
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(ASSET_PACK_MAGIC)
+        f.write(struct.pack("<I", len(header)))
+        f.write(header)
+        f.write(atlas)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    print(f"{path}: {len(rects)} sprites, atlas {atlas_w}x{atlas_h}, {os.path.getsize(path) // 1024} KB")
+
+
+if __name__ == "__main__":
+    build(sys.argv[1] if len(sys.argv) > 1 else ASSET_PACK)
@@ -1,17 +1,31 @@
+import os
+import sys
+
+# Без вікна: python main.py --headless [кадри] або --replay файл.wkr ...
+HEADLESS = "--headless" in sys.argv or "--replay" in sys.argv
+if HEADLESS:
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
 from pygame import *
 import random
-import os
 import json
 import math as Math
-
-init()
-mixer.pre_init(44100, -16, 1, 512)
-mixer.init()
+import mmap
+import struct
+import threading
+import atexit
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, deque
+from functools import cached_property
+from time import perf_counter
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 WIDTH, HEIGHT = 450, 700
-screen = display.set_mode((WIDTH, HEIGHT))
-display.set_caption("Wall Climber Pro: Ultimate Fix")
-clock = time.Clock()
 
 ACCENT_COLOR = (0, 200, 255)
 WHITE = (255, 255, 255)
@@ -25,25 +39,125 @@ AIR_FRICTION = 0.96
 GROUND_FRICTION = 0.8
 CLIMB_SPEED = 3
 
-jump_sfx = None
-if os.path.exists("jump.wav"):
-    jump_sfx = mixer.Sound("jump.wav")
-    jump_sfx.set_volume(0.23)
+# Ціни в монетах: World списує їх сам, тож гра, повтори і soak рахують однаково
+REVIVE_COST = 25
+JETPACK_COST = 20
+
+PARTICLE_CAPACITY = 512
+PARTICLE_RANDOM_BLOCK = 4096
+
+# Генерація рівня
+WALL_GAP = (180, 220)
+MOVING_CHANCE = 0.35
+SPIKE_CHANCE = 0.3
+COIN_CHANCE = 0.3
+SPAWN_AHEAD = HEIGHT  # скільки світу тримаємо згенерованим над екраном
+CHUNK_HEIGHT = HEIGHT // 2
+
+# Шари зірок: (кількість, паралакс, колір)
+STAR_LAYERS = [(50, 0.3, (100, 100, 120))]
+
+WALL_CACHE_SIZE = 64
+WALL_WIDTH_STEP = 1  # >1 округлює ширину стін, щоб різних розмірів було менше
+
+# Фізика йде фіксованим кроком незалежно від частоти кадрів
+PHYSICS_DT = 1000 / 60
+MAX_FRAME_TIME = 250
+RENDER_FPS = int(sys.argv[sys.argv.index("--fps") + 1]) if "--fps" in sys.argv else 60
+DIRTY_RECTS = "--dirty" in sys.argv  # оновлювати лише змінені ділянки екрана
+RECORD_REPLAYS = "--record" in sys.argv  # зберігати кожну гру в REPLAY_DIR
+PROFILE = "--profile" in sys.argv  # почати з увімкненим профайлером (F3)
+
+# --- STATS ---
+# Статистика читається з диска один раз і далі живе в пам'яті.
+# Запис - у фоновому потоці із затримкою, через тимчасовий файл і os.replace,
+# тож падіння посеред запису не зіпсує рекорд
+class StatsStore:
+    def __init__(self, path="highscore.json", legacy_path="highscore.txt", delay=1.0):
+        self.path = path
+        self.legacy_path = legacy_path
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.timer = None
+        self.dirty = False
+        self.data = None
+
+    @property
+    def stats(self):
+        if self.data is None:
+            self.data = self.read()
+        return self.data
+
+    def read(self):
+        data = {"best": 0, "games_played": 0, "total_height": 0, "coins": 0}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r") as f:
+                    loaded = json.load(f)
+            except (OSError, ValueError):
+                loaded = {}
+            # Файл могли відредагувати руками: не-об'єкт ігноруємо, а відомі поля
+            # беремо лише цілими числами, інакше лишається значення за замовчуванням
+            if isinstance(loaded, dict):
+                for key, value in loaded.items():
+                    if key not in data or (isinstance(value, int) and not isinstance(value, bool)):
+                        data[key] = value
+
+        # Старий формат: лише рекорд у highscore.txt
+        if os.path.exists(self.legacy_path):
+            try:
+                with open(self.legacy_path, "r") as f:
+                    data["best"] = max(data["best"], int(f.read().strip() or 0))
+                self.write(data)
+                os.replace(self.legacy_path, self.legacy_path + ".bak")
+            except (OSError, ValueError):
+                pass
+        return data
+
+    def write(self, data):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def save(self):
+        with self.lock:
+            self.dirty = True
+            if self.timer is None:
+                self.timer = threading.Timer(self.delay, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    # Якщо запис не вдався, дані лишаються "брудними": наступний save() або close()
+    # спробує ще раз, а помилка не губиться разом із потоком таймера
+    def flush(self):
+        with self.lock:
+            self.timer = None
+            if not self.dirty:
+                return True
+            try:
+                self.write(dict(self.data))
+            except OSError as e:
+                print(f"can't save stats to {self.path}: {e}", file=sys.stderr)
+                return False
+            self.dirty = False
+            return True
+
+    def close(self):
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+        self.flush()
+
+
+stats_store = StatsStore()
+atexit.register(stats_store.close)
 
 
 def load_stats():
-    default_stats = {"best": 0, "games_played": 0, "total_height": 0, "coins": 0}
-    if os.path.exists("highscore.json"):
-        with open("highscore.json", "r") as f:
-            try:
-                data = json.load(f)
-                for key in default_stats:
-                    if key not in data:
-                        data[key] = default_stats[key]
-                return data
-            except:
-                return default_stats
-    return default_stats
+    return stats_store.stats
 
 
 def save_stats(new_score, current_stats):
@@ -51,19 +165,48 @@ def save_stats(new_score, current_stats):
     current_stats["total_height"] += new_score
     if new_score > current_stats["best"]:
         current_stats["best"] = new_score
-    with open("highscore.json", "w") as f:
-        json.dump(current_stats, f)
+    stats_store.save()
     return current_stats
 
 
 # --- IMAGE LOADING ---
-def load_image(name, color=(80, 80, 90), size=(30, 140)):
+ASSET_PACK = "assets.pack"
+ASSET_PACK_MAGIC = b"WKPK"
+
+# ім'я: (файл, колір заглушки, розмір заглушки, розмір у грі, чи потрібна прозорість)
+SPRITES = {
+    "Fon": ("Fon", (20, 20, 30), (WIDTH, HEIGHT), (WIDTH, HEIGHT), False),
+    "player": ("player.png", (30, 144, 255), (24, 32), (24, 32), True),
+    "raket": ("raket.png", (255, 100, 0), (34, 42), (34, 42), True),
+    "bortyk": ("bortyk.png", (80, 80, 90), (30, 140), (90, 140), True),  # найширша стіна
+    "moneta": ("moneta.png", (255, 215, 0), (20, 20), (25, 25), True),
+    "onlyraket": ("onlyraket.png", (100, 100, 100), (40, 40), (50, 50), True),
+}
+
+
+# Без відкритого вікна (інструменти, тести) поверхні лишаються у своєму форматі
+def display_format(img, alpha=True):
+    if display.get_surface() is None:
+        return img.copy()
+    return img.convert_alpha() if alpha else img.convert()
+
+
+def find_image(name):
     possible_exts = [name, name + ".png", name + ".jpg"]
     for img_name in possible_exts:
         if os.path.exists(img_name):
-            img = image.load(img_name).convert_alpha()
-            return img
+            return img_name
+    return None
+
+
+def load_image(name, color=(80, 80, 90), size=(30, 140), alpha=True):
+    path = find_image(name)
+    if path:
+        return display_format(image.load(path), alpha)
+    return placeholder_image(name, color, size)
 
+
+def placeholder_image(name, color, size):
     surf = Surface(size)
     surf.fill(color)
     if "moneta" in name:
@@ -72,36 +215,564 @@ def load_image(name, color=(80, 80, 90), size=(30, 140)):
         draw.rect(surf, (100, 100, 100), (0, 0, size[0], size[1]))
         draw.rect(surf, (255, 100, 0), (5, 5, size[0] - 10, size[1] - 10))
     else:
-        draw.rect(surf, (color[0] + 20, color[1] + 20, color[2] + 20), (0, 0, 5, size[1]))
+        draw.rect(surf, [min(255, c + 20) for c in color], (0, 0, 5, size[1]))
     return surf
 
 
-raw_bg = load_image("Fon", (20, 20, 30), (WIDTH, HEIGHT))
-BG_IMG = transform.scale(raw_bg, (WIDTH, HEIGHT))
+def convert_atlas(data, size, assets):
+    atlas = image.frombuffer(data, size, "RGBA")
+    return {name: display_format(atlas.subsurface(entry["rect"]), entry["alpha"])
+            for name, entry in assets.items()}
+
+
+# Пак (див. build_assets.py): магія, довжина заголовка, JSON-заголовок, атлас RGBA.
+# Атлас читається прямо з mmap; read_pack отримує (розмір, заголовки, пікселі) або None
+def open_asset_pack(path, read_pack):
+    try:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm[:4] != ASSET_PACK_MAGIC:
+                return read_pack(None)
+            header_len = struct.unpack_from("<I", mm, 4)[0]
+            header = json.loads(mm[8:8 + header_len])
+            w, h = header["size"]
+            end = 8 + header_len + w * h * 4
+            # Обрізаний пак (обірвана збірка, недокачаний файл) - як відсутній: інакше
+            # спрайти вважались би запакованими, і frombuffer упав би вже в головному потоці
+            if len(mm) < end:
+                raise ValueError(f"{path} is truncated")
+            data = memoryview(mm)[8 + header_len:end]
+            try:
+                return read_pack(((w, h), header["assets"], data))
+            finally:
+                data.release()
+    except (OSError, ValueError, KeyError, struct.error):
+        return read_pack(None)
+
+
+# Одразу переводить атлас у формат екрана
+def load_asset_pack(path=ASSET_PACK):
+    return open_asset_pack(path, lambda pack: convert_atlas(pack[2], pack[0], pack[1]) if pack else {})
+
+
+def load_sprite(pack, name):
+    file, color, fallback_size, size, alpha = SPRITES[name]
+    img = pack.pop(name, None)
+    if img is None:
+        img = load_image(file, color, fallback_size, alpha)
+    if img.get_size() != size:
+        img = transform.scale(img, size)
+    return img
+
+
+# --- ASYNC LOADING ---
+# Декодування PNG і читання паку йде у фоновому потоці, а convert() - лише в головному,
+# бо формат екрана належить вікну. Поки спрайт не готовий, у res лежить заглушка
+class AssetLoader:
+    def __init__(self, path=ASSET_PACK):
+        self.path = path
+        self.ready = deque()  # append/popleft атомарні, тож черга між потоками без замків
+        self.done = 0
+        self.total = len(SPRITES)
+        self.thread = None
+
+    @property
+    def finished(self):
+        return self.done >= self.total
+
+    def start(self):
+        for name, (file, color, fallback_size, size, alpha) in SPRITES.items():
+            img = transform.scale(placeholder_image(file, color, fallback_size), size)
+            res.replace(res.SPRITE_ATTRS[name], display_format(img, alpha))
+        self.thread = threading.Thread(target=self.work, daemon=True)
+        self.thread.start()
+
+    # Виняток тут убив би потік, і done ніколи не дійшов би до total: меню чекало б
+    # вічно. Тому зіпсований пак чи файл лише лишає на місці заглушку
+    def work(self):
+        try:
+            packed = open_asset_pack(self.path, self.read_pack)
+        except Exception as e:
+            print(f"can't read {self.path}: {e}", file=sys.stderr)
+            packed = {}
+        for name, (file, _, _, size, _) in SPRITES.items():
+            if name in packed:
+                continue
+            try:
+                path = find_image(file)
+                img = image.load(path) if path else None
+                if img is not None and img.get_size() != size:
+                    img = transform.scale(img, size)
+            except Exception as e:
+                print(f"can't load {file}: {e}", file=sys.stderr)
+                img = None
+            self.ready.append(("sprite", name, img))
+
+    # Пікселі копіюємо: mmap закриється раніше, ніж головний потік їх конвертує
+    def read_pack(self, pack):
+        if pack is None:
+            return {}
+        size, assets, data = pack
+        assets = {name: entry for name, entry in assets.items() if name in SPRITES}
+        self.ready.append(("pack", size, assets, bytes(data)))
+        return assets
+
+    # Викликається з головного потоку кожен кадр; повертає, чи щось замінилось
+    def poll(self):
+        changed = False
+        while self.ready:
+            item = self.ready.popleft()
+            if item[0] == "pack":
+                _, size, assets, data = item
+                for name, img in convert_atlas(data, size, assets).items():
+                    self.apply(name, img, converted=True)
+            else:
+                self.apply(item[1], item[2])
+            changed = True
+        return changed
+
+    def apply(self, name, img, converted=False):
+        file, _, _, size, alpha = SPRITES[name]
+        if img is not None:
+            if not converted:
+                img = display_format(img, alpha)
+            if img.get_size() != size:
+                img = transform.scale(img, size)
+            res.replace(res.SPRITE_ATTRS[name], img)
+        self.done += 1
+
+    # Перед грою довантажуємо решту, щоб у світі не лишилось заглушок
+    def wait(self):
+        if self.thread:
+            self.thread.join()
+        self.poll()
+
+
+LOADING_POLL = 30  # мс між оновленнями смуги завантаження
+
+
+def draw_loading_bar(surface, loader):
+    w = WIDTH - 100
+    draw.rect(surface, (0, 0, 0), (50, HEIGHT - 60, w, 12), border_radius=6)
+    draw.rect(surface, ACCENT_COLOR, (50, HEIGHT - 60, w * loader.done // loader.total, 12), border_radius=6)
+    return Rect(50, HEIGHT - 60, w, 12)
+
+
+# --- PLAYER SPRITE VARIANTS ---
+def stretch_size(vel_y):
+    speed = abs(vel_y)
+    return max(10, int(24 - speed * 0.5)), min(int(32 + speed), 50)
+
+
+# Віддзеркалені та розтягнуті спрайти будуються один раз, а не щокадру.
+# Ключ - (дивиться вправо, розмір), де розмір None означає звичайний спрайт
+def build_player_variants(img):
+    variants = {}
+    for facing_right in (True, False):
+        base = img if facing_right else transform.flip(img, True, False)
+        variants[facing_right, None] = base
+        # швидкість змінюється кроками по 0.25, після |vel_y| = 28 розмір уже не змінюється
+        for step in range(13, 113):
+            size = stretch_size(step * 0.25)
+            if (facing_right, size) not in variants:
+                variants[facing_right, size] = transform.scale(base, size)
+    return variants
+
+
+def player_variant(facing_right, size=None):
+    variants = res.player_variants
+    img = variants.get((facing_right, size))
+    if img is None:
+        img = transform.scale(variants[facing_right, None], size)
+        variants[facing_right, size] = img
+    return img
+
+
+# --- WALL SURFACES ---
+# Масштабовані стіни спільні для всіх WallPlatform однакового розміру (LRU)
+wall_surfaces = OrderedDict()
+
+
+def wall_surface(width, height):
+    key = (width, height)
+    img = wall_surfaces.get(key)
+    if img is None:
+        img = transform.scale(res.bortyk, key)
+        wall_surfaces[key] = img
+        if len(wall_surfaces) > WALL_CACHE_SIZE:
+            wall_surfaces.popitem(last=False)
+    else:
+        wall_surfaces.move_to_end(key)
+    return img
 
-raw_player = load_image("player.png", (30, 144, 255), (24, 32))
-PLAYER_IMG = transform.scale(raw_player, (24, 32))
 
-raw_player_jet = load_image("raket.png", (255, 100, 0), (34, 42))
-PLAYER_JET_IMG = transform.scale(raw_player_jet, (34, 42))
+def random_wall_width(rng=random):
+    w = rng.randint(30, 90)
+    return w - (w - 30) % WALL_WIDTH_STEP
 
-BORTYK_IMG = load_image("bortyk.png", (80, 80, 90), (30, 140))
 
-raw_coin = load_image("moneta.png", (255, 215, 0), (20, 20))
-COIN_IMG = transform.scale(raw_coin, (25, 25))
+# --- AUDIO ---
+# Буфер 512 семплів на 44.1 кГц - це ~12 мс, менше за один кадр
+AUDIO_FREQ = 44100
+AUDIO_BUFFER = 512
+AUDIO_CHANNELS = 8
+SFX_CHANNELS = 4  # зарезервовані під ефекти, решту мікшер роздає сам
 
-raw_shop_jet = load_image("onlyraket.png", (100, 100, 100), (40, 40))
-SHOP_JET_IMG = transform.scale(raw_shop_jet, (50, 50))
+# Ефекти: назва -> (файл, гучність, пріоритет, мін. інтервал між запусками в мс)
+SOUNDS = {
+    "jump": ("jump.wav", 0.23, 1, 50),
+}
+MUSIC = ("Hero-Immortal.ogg", 0.5)
+
+
+class AudioManager:
+    def __init__(self):
+        self.bank = {}
+        self.channels = []
+        self.priorities = []
+        self.started = []
+        self.last_played = {}
+
+    # Формат мікшера задається лише до init(), інакше init() відкриє пристрій зі своїм буфером
+    def pre_init(self):
+        mixer.pre_init(AUDIO_FREQ, -16, 1, AUDIO_BUFFER)
+
+    # Після init(): резервуємо канали і вантажимо ефекти. Sound перетворюється у формат
+    # мікшера під час завантаження, тож під час гри нічого не ресемплиться
+    def start(self):
+        if not mixer.get_init():
+            return
+        mixer.set_num_channels(AUDIO_CHANNELS)
+        mixer.set_reserved(SFX_CHANNELS)
+        self.channels = [mixer.Channel(i) for i in range(SFX_CHANNELS)]
+        self.priorities = [0] * SFX_CHANNELS
+        self.started = [0] * SFX_CHANNELS
+        for name, (file, volume, priority, interval) in SOUNDS.items():
+            if os.path.exists(file):
+                sound = mixer.Sound(file)
+                sound.set_volume(volume)
+                self.bank[name] = (sound, priority, interval)
+
+    # Вільний канал, а якщо всі зайняті - найменш важливий і найстаріший звук,
+    # не важливіший за новий
+    def pick_channel(self, priority):
+        victim = None
+        for i, channel in enumerate(self.channels):
+            if not channel.get_busy():
+                return i
+            key = (self.priorities[i], self.started[i])
+            if self.priorities[i] <= priority and (victim is None or key < victim[0]):
+                victim = (key, i)
+        return victim[1] if victim else None
+
+    def play(self, name):
+        entry = self.bank.get(name)
+        if entry is None:
+            return None
+        sound, priority, interval = entry
+        # Кілька стрибків поспіль за interval мс дають один звук, а не кашу
+        now = time.get_ticks()
+        if now - self.last_played.get(name, -interval) < interval:
+            return None
+        i = self.pick_channel(priority)
+        if i is None:
+            return None
+        self.channels[i].play(sound)
+        self.priorities[i] = priority
+        self.started[i] = now
+        self.last_played[name] = now
+        return self.channels[i]
+
+    # mixer.music читає файл потроху під час гри, тож старт не чекає на декодування
+    def play_music(self):
+        file, volume = MUSIC
+        if not mixer.get_init() or not os.path.exists(file):
+            return
+        mixer.music.load(file)
+        mixer.music.set_volume(volume)
+        mixer.music.play(-1)
+
+
+audio = AudioManager()
+
+
+# --- APP & RESOURCES ---
+# Імпорт модуля нічого не ініціалізує: вікно, звук і ресурси з'являються при першому зверненні,
+# тож фізику (Player, WallPlatform, World) можна використовувати без вікна
+class App:
+    def __init__(self):
+        self.screen = None
+        self.clock = None
+
+    def start(self):
+        if self.screen is None:
+            audio.pre_init()
+            init()
+            audio.start()
+            self.screen = display.set_mode((WIDTH, HEIGHT))
+            display.set_caption("Wall Climber Pro: Ultimate Fix")
+            self.clock = time.Clock()
+        return self.screen
+
+
+class Resources:
+    # Атрибут, під яким лежить кожен спрайт із SPRITES
+    SPRITE_ATTRS = {"Fon": "bg", "player": "player", "raket": "player_jet",
+                    "bortyk": "bortyk", "moneta": "coin", "onlyraket": "shop_jet"}
+    # Що побудовано зі спрайта і має перебудуватися після його заміни
+    DERIVED = {"player": ["player_variants"], "player_jet": ["player_jet_variants"]}
+
+    def replace(self, attr, img):
+        self.__dict__[attr] = img
+        for derived in self.DERIVED.get(attr, ()):
+            self.__dict__.pop(derived, None)
+        if attr == "bortyk":
+            wall_surfaces.clear()
+
+    @cached_property
+    def pack(self):
+        return load_asset_pack()
+
+    @cached_property
+    def bg(self):
+        return load_sprite(self.pack, "Fon")
+
+    @cached_property
+    def player(self):
+        return load_sprite(self.pack, "player")
+
+    @cached_property
+    def player_jet(self):
+        return load_sprite(self.pack, "raket")
+
+    @cached_property
+    def bortyk(self):
+        return load_sprite(self.pack, "bortyk")
+
+    @cached_property
+    def coin(self):
+        return load_sprite(self.pack, "moneta")
+
+    @cached_property
+    def shop_jet(self):
+        return load_sprite(self.pack, "onlyraket")
+
+    @cached_property
+    def player_variants(self):
+        return build_player_variants(self.player)
+
+    @cached_property
+    def player_jet_variants(self):
+        return {True: self.player_jet, False: transform.flip(self.player_jet, True, False)}
+
+    # Шипи двох напрямків, спільні для всіх Spike
+    @cached_property
+    def spikes(self):
+        images = {}
+        for direction, points in [("LEFT", [(10, 0), (10, 30), (0, 15)]), ("RIGHT", [(0, 0), (0, 30), (10, 15)])]:
+            surf = Surface((10, 30), SRCALPHA)
+            draw.polygon(surf, SPIKE_COLOR, points)
+            images[direction] = display_format(surf)
+        return images
+
+    @cached_property
+    def floor(self):
+        surf = Surface((WIDTH, 40))
+        surf.fill((50, 50, 60))
+        return surf
+
+    @cached_property
+    def shop_overlay(self):
+        surf = Surface((WIDTH, HEIGHT), SRCALPHA)
+        surf.fill((0, 0, 0, 200))
+        return surf
+
+    @cached_property
+    def revive_overlay(self):
+        surf = Surface((WIDTH, HEIGHT), SRCALPHA)
+        surf.fill((50, 0, 0, 220))
+        return surf
+
+
+app = App()
+res = Resources()
+
+
+# --- TEXT ---
+TEXT_CACHE_SIZE = 128
+
+# SysFont шукає шрифт у системі, тож кожен шрифт створюємо лише раз
+fonts = {}
+
+
+def get_font(name, size, bold=False):
+    key = (name, size, bold)
+    fnt = fonts.get(key)
+    if fnt is None:
+        fnt = fonts[key] = font.SysFont(name, size, bold=bold)
+    return fnt
+
+
+# Готові написи (LRU): текст рендериться заново лише коли він змінився
+text_cache = OrderedDict()
+
+
+def render_text(fnt, text, color):
+    key = (fnt, text, color)
+    surf = text_cache.get(key)
+    if surf is None:
+        surf = fnt.render(text, True, color)
+        text_cache[key] = surf
+        if len(text_cache) > TEXT_CACHE_SIZE:
+            text_cache.popitem(last=False)
+    else:
+        text_cache.move_to_end(key)
+    return surf
+
+
+# --- INPUT ---
+IN_LEFT = 1
+IN_RIGHT = 2
+IN_UP = 4
+IN_DOWN = 8
+IN_JUMP = 16
+
+
+def read_held_keys():
+    keys = key.get_pressed()
+    inputs = 0
+    if keys[K_a] or keys[K_LEFT]:
+        inputs |= IN_LEFT
+    if keys[K_d] or keys[K_RIGHT]:
+        inputs |= IN_RIGHT
+    if keys[K_w] or keys[K_UP]:
+        inputs |= IN_UP
+    if keys[K_s] or keys[K_DOWN]:
+        inputs |= IN_DOWN
+    return inputs
+
+
+# --- PROFILER ---
+# Фази кадру, по яких профайлер розкладає час
+PH_INPUT = 0
+PH_WORLD = 1
+PH_PLAYER = 2
+PH_SCROLL = 3
+PH_PARTICLES = 4
+PH_DRAW = 5
+PH_FLIP = 6
+PROFILE_PHASES = ["input", "world", "player", "scroll", "particles", "draw", "flip"]
+PROFILE_COLORS = [(120, 120, 255), (0, 200, 255), (100, 255, 100), (255, 215, 0),
+                  (255, 120, 200), (255, 140, 0), (200, 50, 50)]
+PROFILE_FRAMES = 600  # кільцевий буфер: 10 секунд при 60 FPS
+PROFILE_GRAPH = 200  # скільки останніх кадрів показує графік
+PROFILE_REDRAW = 15  # оверлей перемальовується раз на стільки кадрів
+PROFILE_POS = (10, HEIGHT - 190)
+
+
+# Час кожної фази за кадр (секунди) у кільцевому буфері. Коли профайлер вимкнено,
+# у game_loop і World.step лишається тільки перевірка на None
+class FrameProfiler:
+    def __init__(self, size=PROFILE_FRAMES):
+        self.size = size
+        self.frames = [[0.0] * len(PROFILE_PHASES) for _ in range(size)]
+        self.count = 0
+        self.current = [0.0] * len(PROFILE_PHASES)
+        self.last = 0.0
+        self.surface = None
+        self.drawn_at = None
+
+    # Кадр, який не дійшов до end() (смерть на шипах, вмикання посеред кадру), відкидається
+    def begin(self):
+        self.current[:] = [0.0] * len(PROFILE_PHASES)
+        self.last = perf_counter()
+
+    def mark(self, phase):
+        now = perf_counter()
+        self.current[phase] += now - self.last
+        self.last = now
+
+    def end(self):
+        i = self.count % self.size
+        self.frames[i], self.current = self.current, self.frames[i]
+        self.count += 1
+
+    # Записані кадри від найстаршого до найновішого
+    def history(self):
+        if self.count <= self.size:
+            return self.frames[:self.count]
+        i = self.count % self.size
+        return self.frames[i:] + self.frames[:i]
+
+    def percentiles(self, phase):
+        values = sorted(row[phase] for row in self.history())
+        if not values:
+            return 0.0, 0.0
+        n = len(values)
+        return values[n // 2], values[min(n - 1, n * 99 // 100)]
+
+    def render(self):
+        if self.surface is not None and self.count - self.drawn_at < PROFILE_REDRAW:
+            return self.surface
+        self.drawn_at = self.count
+        surf = Surface((PROFILE_GRAPH + 20, 180), SRCALPHA)
+        surf.fill((0, 0, 0, 180))
+
+        # Графік: стовпчик на кадр, фази одна над одною, 4 px на мілісекунду
+        base = 75
+        for x, row in enumerate(self.history()[-PROFILE_GRAPH:]):
+            y = base
+            for phase, t in enumerate(row):
+                h = t * 4000
+                if h >= 1:
+                    draw.line(surf, PROFILE_COLORS[phase], (x + 10, y), (x + 10, y - h))
+                    y -= h
+        budget_y = base - PHYSICS_DT * 4
+        draw.line(surf, WHITE, (10, budget_y), (PROFILE_GRAPH + 10, budget_y))
+
+        # Тексту тут щоразу новий, тому в спільний кеш render_text його не кладемо
+        fnt = get_font("Consolas", 14)
+        for phase, name in enumerate(PROFILE_PHASES):
+            p50, p99 = self.percentiles(phase)
+            line = fnt.render(f"{name:<10}{p50 * 1000:6.2f}{p99 * 1000:7.2f} ms", True, PROFILE_COLORS[phase])
+            surf.blit(line, (10, 82 + phase * 14))
+        self.surface = surf
+        return surf
+
+    def export_csv(self, path=None):
+        if path is None:
+            path = f"profile-{self.count}.csv"
+        with open(path, "w") as f:
+            f.write("frame," + ",".join(PROFILE_PHASES) + ",total\n")
+            first = max(0, self.count - self.size)
+            for n, row in enumerate(self.history(), first):
+                f.write(f"{n}," + ",".join(f"{t * 1000:.4f}" for t in row) + f",{sum(row) * 1000:.4f}\n")
+        return path
+
+
+# --- PARTICLES ---
+# Частинки - лише прикраса, тож мають власний генератор і не зсувають random рівня
+particle_rng = random.Random()
+
+# Квадратики частинок однакового кольору й розміру малюються однією поверхнею
+particle_squares = {}
+
+
+def particle_square(color, size):
+    surf = particle_squares.get((color, size))
+    if surf is None:
+        surf = Surface((size, size))
+        surf.fill(color)
+        particle_squares[color, size] = surf
+    return surf
 
 
-# --- CLASSES & HELPERS ---
 class Particle:
     def __init__(self, x, y, color):
         self.x = x
         self.y = y
-        self.vel_x = random.uniform(-2, 2)
-        self.vel_y = random.uniform(-2, 2)
-        self.size = random.randint(2, 5)
+        self.vel_x = particle_rng.uniform(-2, 2)
+        self.vel_y = particle_rng.uniform(-2, 2)
+        self.size = particle_rng.randint(2, 5)
         self.color = color
         self.life = 20
 
@@ -111,94 +782,276 @@ class Particle:
         self.size -= 0.1
         self.life -= 1
 
-    def draw(self, surface):
+    def draw(self, surface, alpha=1.0, camera_y=0):
         if self.life > 0 and self.size > 0:
-            draw.rect(surface, self.color, (self.x, self.y, self.size, self.size))
+            back = 1 - alpha
+            draw.rect(surface, self.color, (self.x - self.vel_x * back, self.y - self.vel_y * back - camera_y,
+                                            self.size, self.size))
 
 
-particles = []
+# Запасний варіант без numpy: звичайний список Particle з тією ж межею кількості
+class ParticleList:
+    def __init__(self, capacity=PARTICLE_CAPACITY):
+        self.capacity = capacity
+        self.items = []
 
+    def __len__(self):
+        return len(self.items)
 
-def create_particles(x, y, color, count=5):
-    for _ in range(count):
-        particles.append(Particle(x, y, color))
+    def clear(self):
+        self.items.clear()
+
+    def emit(self, x, y, color, count):
+        for _ in range(min(count, self.capacity - len(self.items))):
+            self.items.append(Particle(x, y, color))
+
+    def update(self):
+        for p in self.items:
+            p.update()
+        self.items[:] = [p for p in self.items if p.life > 0]
+
+    def draw(self, surface, alpha=1.0, camera_y=0):
+        for p in self.items:
+            p.draw(surface, alpha, camera_y)
+
+    def bounds(self, alpha=1.0, camera_y=0):
+        if not self.items:
+            return None
+        back = 1 - alpha
+        xs = [p.x - p.vel_x * back for p in self.items]
+        ys = [p.y - p.vel_y * back - camera_y for p in self.items]
+        return Rect(int(min(xs)) - 1, int(min(ys)) - 1, int(max(xs) - min(xs)) + 7, int(max(ys) - min(ys)) + 7)
+
+
+# Пул фіксованого розміру: кожне поле - окремий масив, живі частинки займають перші count слотів.
+# Розмір не оновлюється щокроку, а рахується з віку: size = start_size - 0.1 * (20 - life)
+class ParticlePool:
+    def __init__(self, capacity=PARTICLE_CAPACITY):
+        self.capacity = capacity
+        self.count = 0
+        self.pos = np.zeros((capacity, 2), np.float32)
+        self.vel = np.zeros((capacity, 2), np.float32)
+        self.start_size = np.zeros(capacity, np.float32)
+        self.life = np.zeros(capacity, np.int16)
+        self.color = np.zeros(capacity, np.uint8)
+        self.fields = (self.pos, self.vel, self.start_size, self.life, self.color)
+        self.palette = {}
+        self.rng = np.random.default_rng()
+        self.refill_random()
+
+    # Випадкові швидкості й розміри генеруються наперед блоками, а не на кожен emit
+    def refill_random(self):
+        self.random_vel = self.rng.uniform(-2, 2, (PARTICLE_RANDOM_BLOCK, 2)).astype(np.float32)
+        self.random_size = self.rng.integers(2, 6, PARTICLE_RANDOM_BLOCK).astype(np.float32)
+        self.random_pos = 0
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.count = 0
+
+    def emit(self, x, y, color, count):
+        start = self.count
+        end = min(start + count, self.capacity)
+        n = end - start
+        if n <= 0:
+            return
+        color_index = self.palette.setdefault(color, len(self.palette))
+        if self.random_pos + n > PARTICLE_RANDOM_BLOCK:
+            self.refill_random()
+        r = self.random_pos
+        self.random_pos = r + n
+
+        self.pos[start:end] = (x, y)
+        self.vel[start:end] = self.random_vel[r:r + n]
+        self.start_size[start:end] = self.random_size[r:r + n]
+        self.life[start:end] = 20
+        self.color[start:end] = color_index
+        self.count = end
 
+    def update(self):
+        n = self.count
+        if n == 0:
+            return
+        self.pos[:n] += self.vel[:n]
+        self.life[:n] -= 1
+
+        dead = np.flatnonzero(self.life[:n] <= 0)
+        if len(dead):
+            # Мертві слоти всередині нової довжини заповнюємо живими з хвоста
+            alive = n - len(dead)
+            holes = dead[dead < alive]
+            movers = alive + np.flatnonzero(self.life[alive:n] > 0)
+            for field in self.fields:
+                field[holes] = field[movers]
+            self.count = alive
+
+    def draw(self, surface, alpha=1.0, camera_y=0):
+        n = self.count
+        if n == 0:
+            return
+        pos = self.pos[:n] - self.vel[:n] * (1 - alpha)
+        pos[:, 1] -= camera_y
+        sizes = (self.start_size[:n] - 0.1 * (20 - self.life[:n])).astype(np.int32).tolist()
+        palette = list(self.palette)
+        surface.blits([(particle_square(palette[c], s), p)
+                       for p, s, c in zip(pos.astype(np.int32).tolist(), sizes, self.color[:n].tolist()) if s > 0],
+                      False)
 
-# ФУНКЦІЯ ДЛЯ ЖОРСТКОЇ ПЕРЕВІРКИ НАКЛАДАННЯ
-def check_platform_overlap(platforms, new_x, new_y, new_w, new_h, new_range):
-    for p in platforms:
-        if not p.is_floor:
-            # Чи перетинаються вони по осі X? (знаходяться на одній стіні)
-            p_left, p_right = p.rect.left, p.rect.right
-            n_left, n_right = new_x, new_x + new_w
+    def bounds(self, alpha=1.0, camera_y=0):
+        n = self.count
+        if n == 0:
+            return None
+        pos = self.pos[:n] - self.vel[:n] * (1 - alpha)
+        (left, top), (right, bottom) = pos.min(axis=0), pos.max(axis=0)
+        return Rect(int(left) - 1, int(top - camera_y) - 1, int(right - left) + 7, int(bottom - top) + 7)
 
-            if not (n_right < p_left or n_left > p_right):
-                # Чи перетинаються їхні зони руху по осі Y?
-                p_top = p.start_y - p.range
-                p_bot = p.start_y + p.range + p.rect.height
 
-                n_top = new_y - new_range
-                n_bot = new_y + new_range + new_h
+particles = ParticlePool() if np is not None else ParticleList()
 
-                # Додаємо 15 пікселів відступу для безпеки
-                if not (n_bot < p_top - 15 or n_top > p_bot + 15):
-                    return True  # Виявлено накладання!
-    return False
 
+def create_particles(x, y, color, count=5):
+    particles.emit(x, y, color, count)
+
+
+# --- STARFIELD ---
+# Шар зірок малюється один раз у поверхню висотою з екран, що повторюється по вертикалі,
+# тож прокрутка - це два blit зі зсувом, скільки б зірок не було
+STAR_COLORKEY = (0, 0, 0)
+
+
+class Starfield:
+    def __init__(self, count, parallax, color, rng=random):
+        self.parallax = parallax
+        self.surface = Surface((WIDTH, HEIGHT))
+        self.surface.fill(STAR_COLORKEY)
+        for _ in range(count):
+            x, y, r = rng.randint(0, WIDTH), rng.randint(0, HEIGHT), rng.randint(1, 2)
+            # зірки біля краю малюємо ще й з іншого боку, щоб шар зшивався без шва
+            for dy in (-HEIGHT, 0, HEIGHT):
+                draw.circle(self.surface, color, (x, y + dy), r)
+        self.surface.set_colorkey(STAR_COLORKEY, RLEACCEL)
+
+    def draw(self, surface, cam):
+        offset = int(-cam * self.parallax) % HEIGHT
+        surface.blit(self.surface, (0, offset))
+        surface.blit(self.surface, (0, offset - HEIGHT))
+
+
+# --- SPATIAL INDEX ---
+GRID_CELL = 128
+
+
+def grid_cells(rect):
+    return [(cx, cy)
+            for cx in range(rect.left // GRID_CELL, (rect.right - 1) // GRID_CELL + 1)
+            for cy in range(rect.top // GRID_CELL, (rect.bottom - 1) // GRID_CELL + 1)]
+
+
+# Група зі сіткою у світових координатах: зіткнення перевіряються лише з сусідами.
+# Спрайт потрапляє в клітинки всієї зони, яку може пройти (sweep_rect), тож рух
+# стін і монет індекс не чіпає; kill() прибирає спрайт з індексу через remove_internal
+class IndexedGroup(sprite.Group):
+    def __init__(self, *sprites):
+        self.cells = {}
+        self.sprite_cells = {}
+        self.order = {}
+        self.next_order = 0
+        super().__init__(*sprites)
+
+    def add_internal(self, spr, layer=None):
+        super().add_internal(spr, layer)
+        area = spr.sweep_rect() if hasattr(spr, "sweep_rect") else spr.rect
+        keys = grid_cells(area)
+        for key in keys:
+            self.cells.setdefault(key, []).append(spr)
+        self.sprite_cells[spr] = keys
+        self.order[spr] = self.next_order
+        self.next_order += 1
+
+    def remove_internal(self, spr):
+        super().remove_internal(spr)
+        for key in self.sprite_cells.pop(spr):
+            cell = self.cells[key]
+            cell.remove(spr)
+            if not cell:
+                del self.cells[key]
+        del self.order[spr]
+
+    # Те саме, що sprite.spritecollide(spr, group, dokill), у порядку додавання
+    def collide(self, spr, dokill=False):
+        rect = spr.rect
+        hits = []
+        for key in grid_cells(rect):
+            for other in self.cells.get(key, ()):
+                if rect.colliderect(other.rect) and other not in hits:
+                    hits.append(other)
+        if len(hits) > 1:
+            hits.sort(key=self.order.__getitem__)
+        if dokill:
+            for other in hits:
+                other.kill()
+        return hits
 
+
+# --- CLASSES & HELPERS ---
+# Монети, шипи і стіни перевикористовуються через SpritePool: reset() повертає
+# об'єкт у стан, ніби його щойно створили з тими самими аргументами
 class Coin(sprite.Sprite):
     def __init__(self, x, y):
         super().__init__()
-        self.image = COIN_IMG
+        self.reset(x, y)
+
+    def reset(self, x, y):
+        self.image = res.coin
         self.rect = self.image.get_rect(center=(x, y))
         self.start_y = y
 
-    def update(self, scroll_y=0):
-        self.rect.y = self.start_y + int(Math.sin(time.get_ticks() * 0.005) * 5)
+    # bob - спільне для всіх монет зміщення гойдання, World рахує його раз за крок
+    def update(self, bob=0):
+        self.rect.y = self.start_y + bob
+
+    def sweep_rect(self):
+        return Rect(self.rect.x, self.start_y - 5, self.rect.width, self.rect.height + 10)
 
 
+# Шипи бувають лише на нерухомих стінах, тож позицію рахуємо один раз і не оновлюємо
 class Spike(sprite.Sprite):
     def __init__(self, wall, direction, offset_y):
         super().__init__()
-        self.image = Surface((10, 30), SRCALPHA)
-        if direction == "LEFT":
-            draw.polygon(self.image, SPIKE_COLOR, [(10, 0), (10, 30), (0, 15)])
-            x_pos = wall.rect.left - 10
-        else:
-            draw.polygon(self.image, SPIKE_COLOR, [(0, 0), (0, 30), (10, 15)])
-            x_pos = wall.rect.right
+        self.reset(wall, direction, offset_y)
 
+    def reset(self, wall, direction, offset_y):
+        self.image = res.spikes[direction]
+        x_pos = wall.rect.left - 10 if direction == "LEFT" else wall.rect.right
         self.rect = self.image.get_rect(topleft=(x_pos, wall.rect.y + offset_y))
-
         self.wall = wall
-        self.offset_x = self.rect.x - wall.rect.x
-        self.offset_y = offset_y
-
-    def update(self):
-        if self.wall:
-            self.rect.x = self.wall.rect.x + self.offset_x
-            self.rect.y = self.wall.rect.y + self.offset_y
 
 
 class WallPlatform(sprite.Sprite):
-    def __init__(self, x, y, width=30, height=140, is_floor=False, moving=False, move_range=50):
+    def __init__(self, x, y, width=30, height=140, is_floor=False, moving=False, move_range=50, rng=random):
         super().__init__()
+        self.reset(x, y, width, height, is_floor, moving, move_range, rng)
+
+    def reset(self, x, y, width=30, height=140, is_floor=False, moving=False, move_range=50, rng=random):
         self.is_floor = is_floor
         self.moving = moving
-        self.dir = random.choice([-1, 1])
-        self.speed = random.uniform(0.5, 1.5)
+        self.dir = rng.choice([-1, 1])
+        self.speed = rng.uniform(0.5, 1.5)
         self.start_y = y
+        self.prev_y = y
         self.range = move_range if moving else 0
         self.spike_data = None
+        self.spike = None
 
         if is_floor:
-            self.image = Surface((WIDTH, 40))
-            self.image.fill((50, 50, 60))
+            self.image = res.floor
         else:
-            self.image = transform.scale(BORTYK_IMG, (width, height))
-            if not moving and random.random() < 0.3:
+            self.image = wall_surface(width, height)
+            if not moving and rng.random() < SPIKE_CHANCE:
                 self.spike_data = {
-                    "offset": random.randint(20, height - 40),
+                    "offset": rng.randint(20, height - 40),
                     "direction": "RIGHT" if x < WIDTH // 2 else "LEFT"
                 }
 
@@ -206,17 +1059,54 @@ class WallPlatform(sprite.Sprite):
 
     def update(self):
         if self.moving and not self.is_floor:
+            self.prev_y = self.rect.y
             self.rect.y += self.dir * self.speed
             if abs(self.rect.y - self.start_y) > self.range:
                 self.dir *= -1
 
+    # Шип належить стіні і зникає разом з нею
+    def kill(self):
+        if self.spike:
+            self.spike.kill()
+        super().kill()
+
+    # Уся зона, яку стіна проходить під час руху (з запасом на проскок за range)
+    def sweep_rect(self):
+        return Rect(self.rect.x, self.start_y - self.range - 2, self.rect.width, self.rect.height + self.range * 2 + 4)
+
+
+# Вільні спрайти одного класу. Відпускати можна лише вбитий спрайт, на який
+# більше ніхто не посилається
+class SpritePool:
+    def __init__(self, cls):
+        self.cls = cls
+        self.free = []
+
+    def __len__(self):
+        return len(self.free)
+
+    def acquire(self, *args, **kwargs):
+        if self.free:
+            obj = self.free.pop()
+            obj.reset(*args, **kwargs)
+            return obj
+        return self.cls(*args, **kwargs)
+
+    def release(self, obj):
+        self.free.append(obj)
+
+
+wall_pool = SpritePool(WallPlatform)
+spike_pool = SpritePool(Spike)
+coin_pool = SpritePool(Coin)
+
 
 class Player(sprite.Sprite):
     def __init__(self):
         super().__init__()
-        self.original_image = PLAYER_IMG
-        self.image = self.original_image
+        self.image = res.player
         self.rect = self.image.get_rect(center=(WIDTH // 2, HEIGHT - 60))
+        self.prev_pos = self.rect.topleft
         self.vel_x = 0
         self.vel_y = 0
         self.on_wall = None
@@ -235,15 +1125,15 @@ class Player(sprite.Sprite):
         self.on_wall = None
         create_particles(self.rect.centerx, self.rect.bottom, (255, 100, 0), 20)
 
-    def update(self, keys, platforms, current_score):
+    def update(self, inputs, platforms, current_score):
         if self.is_flying:
             self.vel_y = -15
             self.vel_x = 0
 
-            if keys[K_a] or keys[K_LEFT]:
+            if inputs & IN_LEFT:
                 self.vel_x = -9
                 self.facing_right = False
-            elif keys[K_d] or keys[K_RIGHT]:
+            elif inputs & IN_RIGHT:
                 self.vel_x = 9
                 self.facing_right = True
 
@@ -252,10 +1142,7 @@ class Player(sprite.Sprite):
 
             create_particles(self.rect.centerx, self.rect.bottom, (255, 200, 50), 2)
 
-            if self.facing_right:
-                self.image = PLAYER_JET_IMG
-            else:
-                self.image = transform.flip(PLAYER_JET_IMG, True, False)
+            self.image = res.player_jet_variants[self.facing_right]
 
             if current_score >= self.fly_target_height:
                 self.is_flying = False
@@ -269,9 +1156,9 @@ class Player(sprite.Sprite):
         if self.on_wall:
             self.jumps_left = 2
             self.vel_y = 0
-            if keys[K_w] or keys[K_UP]:
+            if inputs & IN_UP:
                 self.vel_y = -CLIMB_SPEED
-            elif keys[K_s] or keys[K_DOWN]:
+            elif inputs & IN_DOWN:
                 self.vel_y = CLIMB_SPEED
 
             if self.attached_platform and self.attached_platform.moving:
@@ -280,10 +1167,10 @@ class Player(sprite.Sprite):
             self.vel_y += GRAVITY
             self.attached_platform = None
 
-        if keys[K_a] or keys[K_LEFT]:
+        if inputs & IN_LEFT:
             self.vel_x -= 0.6
             self.facing_right = False
-        if keys[K_d] or keys[K_RIGHT]:
+        if inputs & IN_RIGHT:
             self.vel_x += 0.6
             self.facing_right = True
 
@@ -294,7 +1181,7 @@ class Player(sprite.Sprite):
 
         self.rect.x += self.vel_x
         self.on_wall = None
-        hits_x = sprite.spritecollide(self, platforms, False)
+        hits_x = platforms.collide(self)
         for hit in hits_x:
             if not hit.is_floor:
                 if self.vel_x > 0:
@@ -312,7 +1199,7 @@ class Player(sprite.Sprite):
 
         self.rect.y += self.vel_y
         self.on_ground = False
-        hits_y = sprite.spritecollide(self, platforms, False)
+        hits_y = platforms.collide(self)
         for hit in hits_y:
             if self.vel_y > 0:
                 if self.rect.bottom <= hit.rect.top + 15:
@@ -325,16 +1212,10 @@ class Player(sprite.Sprite):
                     self.rect.top = hit.rect.bottom
                     self.vel_y = 0
 
-        current_img = self.original_image
-        if not self.facing_right:
-            current_img = transform.flip(self.original_image, True, False)
-
         if abs(self.vel_y) > 3 and not self.on_wall:
-            scale_y = int(32 + abs(self.vel_y))
-            scale_x = int(24 - abs(self.vel_y) * 0.5)
-            self.image = transform.scale(current_img, (max(10, scale_x), min(scale_y, 50)))
+            self.image = player_variant(self.facing_right, stretch_size(self.vel_y))
         else:
-            self.image = current_img
+            self.image = player_variant(self.facing_right)
 
         if self.rect.left < 0:
             self.rect.left = 0
@@ -367,8 +1248,7 @@ class Player(sprite.Sprite):
             create_particles(self.rect.centerx, self.rect.bottom, WHITE)
 
         if jumped:
-            if jump_sfx:
-                jump_sfx.play()
+            audio.play("jump")
 
         self.on_wall = None
         self.attached_platform = None
@@ -376,328 +1256,986 @@ class Player(sprite.Sprite):
         return jumped
 
 
+# Статичні екрани не крутять цикл: малюємо раз і чекаємо на подію (або таймаут для блимання)
+def wait_events(timeout=None):
+    first = event.wait() if timeout is None else event.wait(timeout)
+    events = [first] + event.get()
+    if any(ev.type == WINDOWEXPOSED for ev in events):
+        display.flip()
+    return events
+
+
 def draw_shop_ui(surface, stats):
-    overlay = Surface((WIDTH, HEIGHT), SRCALPHA)
-    overlay.fill((0, 0, 0, 200))
-    surface.blit(overlay, (0, 0))
+    surface.blit(res.shop_overlay, (0, 0))
 
-    font_title = font.SysFont("Arial", 40, bold=True)
-    font_item = font.SysFont("Arial", 24)
-    font_small = font.SysFont("Arial", 18)
+    font_title = get_font("Arial", 40, bold=True)
+    font_item = get_font("Arial", 24)
+    font_small = get_font("Arial", 18)
 
-    title = font_title.render("SHOP (PAUSE)", True, ACCENT_COLOR)
+    title = render_text(font_title, "SHOP (PAUSE)", ACCENT_COLOR)
     surface.blit(title, (WIDTH // 2 - title.get_width() // 2, 100))
 
-    coins_text = font_item.render(f"Coins: {stats['coins']}", True, GOLD_COLOR)
+    coins_text = render_text(font_item, f"Coins: {stats['coins']}", GOLD_COLOR)
     surface.blit(coins_text, (WIDTH // 2 - coins_text.get_width() // 2, 160))
 
     draw.rect(surface, (50, 50, 60), (50, 220, WIDTH - 100, 100), border_radius=10)
-    surface.blit(SHOP_JET_IMG, (60, 245))
+    surface.blit(res.shop_jet, (60, 245))
 
-    name_text = font_item.render("Jetpack (+250m)", True, WHITE)
-    cost_text = font_item.render("Cost: 20 Coins", True, GOLD_COLOR)
-    key_text = font_small.render("[Press 1 to Buy]", True, (200, 200, 200))
+    name_text = render_text(font_item, "Jetpack (+250m)", WHITE)
+    cost_text = render_text(font_item, f"Cost: {JETPACK_COST} Coins", GOLD_COLOR)
+    key_text = render_text(font_small, "[Press 1 to Buy]", (200, 200, 200))
 
     surface.blit(name_text, (120, 235))
     surface.blit(cost_text, (120, 265))
     surface.blit(key_text, (120, 295))
 
-    exit_text = font_small.render("Press ESC to Resume", True, WHITE)
+    exit_text = render_text(font_small, "Press ESC to Resume", WHITE)
     surface.blit(exit_text, (WIDTH // 2 - exit_text.get_width() // 2, HEIGHT - 50))
 
 
 def draw_revive_ui(surface, stats):
-    overlay = Surface((WIDTH, HEIGHT), SRCALPHA)
-    overlay.fill((50, 0, 0, 220))
-    surface.blit(overlay, (0, 0))
+    surface.blit(res.revive_overlay, (0, 0))
 
-    font_title = font.SysFont("Arial", 40, bold=True)
-    font_text = font.SysFont("Arial", 25)
+    font_title = get_font("Arial", 40, bold=True)
+    font_text = get_font("Arial", 25)
 
-    title = font_title.render("YOU DIED!", True, WHITE)
+    title = render_text(font_title, "YOU DIED!", WHITE)
     surface.blit(title, (WIDTH // 2 - title.get_width() // 2, 200))
 
-    if stats['coins'] >= 25:
-        q_text = font_text.render("Revive for 25 Coins?", True, GOLD_COLOR)
-        y_text = font_text.render("[Y] YES     [N] NO", True, WHITE)
+    if stats['coins'] >= REVIVE_COST:
+        q_text = render_text(font_text, f"Revive for {REVIVE_COST} Coins?", GOLD_COLOR)
+        y_text = render_text(font_text, "[Y] YES     [N] NO", WHITE)
         surface.blit(q_text, (WIDTH // 2 - q_text.get_width() // 2, 300))
         surface.blit(y_text, (WIDTH // 2 - y_text.get_width() // 2, 350))
     else:
-        q_text = font_text.render("Not enough coins to revive...", True, (150, 150, 150))
-        n_text = font_text.render("Press SPACE to Continue", True, WHITE)
+        q_text = render_text(font_text, "Not enough coins to revive...", (150, 150, 150))
+        n_text = render_text(font_text, "Press SPACE to Continue", WHITE)
         surface.blit(q_text, (WIDTH // 2 - q_text.get_width() // 2, 300))
         surface.blit(n_text, (WIDTH // 2 - n_text.get_width() // 2, 350))
 
 
-def game_loop():
-    player = Player()
-    platforms = sprite.Group()
-    spikes = sprite.Group()
-    coins_group = sprite.Group()
-    particles.clear()
-
-    score = 0
-    font_ui = font.SysFont("Arial", 25, bold=True)
-    stats = load_stats()
+# --- LEVEL GENERATION ---
+# Зони руху стін, відсортовані за верхньою межею. Зона не довша за max_len,
+# тож перетин шукаємо лише серед зон, чий верх лежить у [top - max_len, bottom]
+class IntervalIndex:
+    def __init__(self):
+        self.tops = []
+        self.zones = []
+        self.max_len = 0
+
+    def __len__(self):
+        return len(self.zones)
+
+    def add(self, top, bottom, left, right):
+        i = bisect_right(self.tops, top)
+        self.tops.insert(i, top)
+        self.zones.insert(i, (top, bottom, left, right))
+        self.max_len = max(self.max_len, bottom - top)
+
+    def overlaps(self, top, bottom, left, right):
+        i = bisect_left(self.tops, top - self.max_len)
+        j = bisect_right(self.tops, bottom)
+        for z_top, z_bottom, z_left, z_right in self.zones[i:j]:
+            if z_bottom >= top and not (right < z_left or left > z_right):
+                return True
+        return False
+
+    # Зони нижче y вже ніколи не перетнуться з новими стінами (нові лише вище)
+    def prune_below(self, y):
+        while self.tops and self.tops[-1] > y:
+            self.tops.pop()
+            self.zones.pop()
+
+
+# Генерує стіни, шипи й монети над камерою шматками по CHUNK_HEIGHT.
+# Власний Random: однаковий seed дає однаковий рівень
+class LevelGenerator:
+    def __init__(self, seed=None):
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.zones = IntervalIndex()
+        self.count = 0
+        self.top_y = HEIGHT - 180 + WALL_GAP[0]  # y останньої стіни; перша стане на HEIGHT - 180
+
+    # ФУНКЦІЯ ДЛЯ ЖОРСТКОЇ ПЕРЕВІРКИ НАКЛАДАННЯ
+    def overlaps(self, x, y, w, h, move_range):
+        # Зони руху по осі Y + 15 пікселів відступу для безпеки; по X - та сама стіна
+        return self.zones.overlaps(y - move_range - 15, y + move_range + h + 15, x, x + w)
+
+    def next_wall(self):
+        rng = self.rng
+        # Перші дві стіни нерухомі, перші шість частіше рухаються і без монет
+        first = self.count < 6
+        y = HEIGHT - 180 if self.count == 0 else self.top_y - rng.randint(*WALL_GAP)
+        w = random_wall_width(rng)
+        side = rng.choice([0, WIDTH - w])
+        if self.count < 2:
+            moving = False
+        else:
+            moving = rng.random() < (0.5 if first else MOVING_CHANCE)
+        move_range = rng.randint(40, 80) if moving else 0
 
-    platforms.add(WallPlatform(0, HEIGHT - 40, is_floor=True))
+        # Перевіряємо віртуальну зону руху на накладання
+        if self.overlaps(side, y, w, 140, move_range):
+            side = 0 if side > 0 else WIDTH - w  # Міняємо стіну
 
-    last_y = HEIGHT - 180
-    for i in range(6):
-        w = random.randint(30, 90)
-        side = random.choice([0, WIDTH - w])
-        moving = random.choice([True, False]) if i > 1 else False
-        move_range = random.randint(40, 80) if moving else 0
+            # Якщо навіть протилежна стіна зайнята (дуже рідко), робимо статичною і відсуваємо
+            if self.overlaps(side, y, w, 140, move_range):
+                y -= 150
+                moving = False
+                move_range = 0
+
+        wall = wall_pool.acquire(side, y, width=w, moving=moving, move_range=move_range, rng=rng)
+        self.zones.add(y - move_range, y + move_range + 140, side, side + w)
+        self.top_y = y
+        self.count += 1
+
+        coin = None
+        if not first and rng.random() < COIN_CHANCE:
+            cx = side + w + 30 if side == 0 else side - 30
+            if rng.random() < 0.5:
+                cx = WIDTH // 2
+            coin = coin_pool.acquire(cx, y - rng.randint(20, 100))
+        return wall, coin
+
+    # Добудовує світ так, щоб над target_y був запас у ще один шматок
+    def generate(self, target_y):
+        if self.top_y <= target_y:
+            return []
+        chunk = []
+        while self.top_y > target_y - CHUNK_HEIGHT:
+            chunk.append(self.next_wall())
+        return chunk
+
+
+# Усі сутності живуть у світових координатах, камера лише зсуває їх при малюванні
+class World:
+    def __init__(self, stats, seed=None):
+        self.stats = stats
+        self.player = Player()
+        self.platforms = IndexedGroup()
+        self.spikes = IndexedGroup()
+        self.coins_group = IndexedGroup()
+        particles.clear()
+
+        self.score = 0
+        self.frame = 0
+        self.state = "PLAYING"
+        self.camera_y = 0
+        self.prev_camera_y = 0
+        self.profiler = None
+        self.coin_bob = 0
+
+        # Стіни й монети в порядку появи (знизу вгору) - видаляємо лише з голови черги
+        self.wall_queue = deque()
+        self.coin_queue = deque()
+
+        self.generator = LevelGenerator(seed)
+        self.rng = self.generator.rng
+        self.add_wall(wall_pool.acquire(0, HEIGHT - 40, is_floor=True, rng=self.rng))
+        self.stream_level()
+
+    def add_wall(self, wall):
+        self.platforms.add(wall)
+        self.wall_queue.append(wall)
+        if wall.spike_data:
+            wall.spike = spike_pool.acquire(wall, wall.spike_data["direction"], wall.spike_data["offset"])
+            self.spikes.add(wall.spike)
+
+    def despawn_wall(self, wall):
+        wall.kill()
+        if wall.spike:
+            spike_pool.release(wall.spike)
+            wall.spike = None
+        wall_pool.release(wall)
+
+    # Кінець гри: усе, що ще живе у світі, повертається в пули для наступного World
+    def release(self):
+        while self.wall_queue:
+            self.despawn_wall(self.wall_queue.popleft())
+        while self.coin_queue:
+            coin = self.coin_queue.popleft()
+            coin.kill()
+            coin_pool.release(coin)
+
+    def stream_level(self):
+        for wall, coin in self.generator.generate(self.camera_y - SPAWN_AHEAD):
+            if coin:
+                coin.update(self.coin_bob)
+                self.coins_group.add(coin)
+                self.coin_queue.append(coin)
+            self.add_wall(wall)
+
+    def step(self, inputs):
+        if self.state != "PLAYING":
+            return self.state
+
+        prof = self.profiler
+
+        self.frame += 1
+        self.prev_camera_y = self.camera_y
+        player = self.player
+        player.prev_pos = player.rect.topleft
+
+        for p in self.platforms:
+            p.update()
 
-        # Перевіряємо чи безпечно спавнити при генерації
-        if check_platform_overlap(platforms, side, last_y, w, 140, move_range):
-            side = 0 if side > 0 else WIDTH - w  # Міняємо стіну
-            if check_platform_overlap(platforms, side, last_y, w, 140, move_range):
-                last_y -= 150  # Якщо обидві стіни зайняті, просто відступаємо вище
+        # Гойдання рахуємо від номера кроку фізики, а не від годинника, щоб повтор збігався.
+        # Зміщення ціле, тож монети рухаються лише коли воно змінилось
+        bob = int(Math.sin(self.frame * PHYSICS_DT * 0.005) * 5)
+        if bob != self.coin_bob:
+            self.coin_bob = bob
+            for c in self.coins_group:
+                c.update(bob)
 
-        wall = WallPlatform(side, last_y, width=w, moving=moving, move_range=move_range)
-        platforms.add(wall)
+        if self.coins_group.collide(player, True):
+            self.stats['coins'] += 1
 
-        if wall.spike_data:
-            spikes.add(Spike(wall, wall.spike_data["direction"], wall.spike_data["offset"]))
+        if not player.is_flying and self.spikes.collide(player):
+            self.state = "SPIKE"
+            return self.state
+
+        if prof:
+            prof.mark(PH_WORLD)
+
+        if inputs & IN_JUMP:
+            player.jump()
+
+        player.update(inputs, self.platforms, self.score)
+
+        if prof:
+            prof.mark(PH_PLAYER)
+
+        target_cam_y = self.camera_y + HEIGHT // 2
+
+        if player.rect.y < target_cam_y:
+            self.camera_y = player.rect.y - HEIGHT // 2
+            self.score = -self.camera_y
+
+            bottom = self.camera_y + HEIGHT
+            coins = self.coin_queue
+            while coins and coins[0].rect.y > bottom:
+                coin = coins.popleft()
+                coin.kill()
+                coin_pool.release(coin)
+
+            walls = self.wall_queue
+            if walls and walls[0].rect.y > bottom:
+                while walls and walls[0].rect.y > bottom:
+                    self.despawn_wall(walls.popleft())
+                self.generator.zones.prune_below(bottom)
+
+            self.stream_level()
+
+        if prof:
+            prof.mark(PH_SCROLL)
+
+        particles.update()
+
+        if prof:
+            prof.mark(PH_PARTICLES)
+
+        if player.rect.top - self.camera_y > HEIGHT:
+            self.state = "FELL"
+        return self.state
+
+    def revive(self, cost=REVIVE_COST):
+        self.stats['coins'] -= cost
+        player = self.player
+        player.rect.y = self.camera_y + HEIGHT // 2
+        player.vel_y = -5
+        player.is_flying = False
+        player.prev_pos = player.rect.topleft
+        for s in self.spikes:
+            if abs(s.rect.y - player.rect.y) < 200:
+                s.kill()
+                s.wall.spike = None
+                spike_pool.release(s)
+        self.state = "PLAYING"
+
+    def buy_jetpack(self):
+        if self.stats['coins'] < JETPACK_COST or self.player.is_flying:
+            return False
+        self.stats['coins'] -= JETPACK_COST
+        self.player.activate_jetpack(self.score)
+        return True
+
+    # alpha - частка кроку фізики між попереднім і поточним станом
+    def camera_at(self, alpha):
+        return self.prev_camera_y + (self.camera_y - self.prev_camera_y) * alpha
+
+    # Зорі - лише прикраса: свій Random, щоб зміна STAR_LAYERS не зсувала генерацію
+    # рівня, і будуються при першому малюванні, тож headless-прогони їх не створюють
+    @cached_property
+    def starfields(self):
+        rng = random.Random(self.generator.seed)
+        return [Starfield(count, parallax, color, rng) for count, parallax, color in STAR_LAYERS]
+
+    def draw_background(self, surface, cam):
+        surface.blit(res.bg, (0, 0))
+        for layer in self.starfields:
+            layer.draw(surface, cam)
+
+    # Спрайти в порядку малювання: [(поверхня, (x, y)), ...] в екранних координатах
+    def draw_items(self, alpha, cam):
+        items = []
+        for p in self.platforms:
+            if p.moving:
+                y = p.prev_y + (p.rect.y - p.prev_y) * alpha
+            else:
+                y = p.rect.y
+            items.append((p.image, (p.rect.x, int(y - cam))))
+        for s in self.spikes:
+            items.append((s.image, (s.rect.x, int(s.rect.y - cam))))
+        for c in self.coins_group:
+            items.append((c.image, (c.rect.x, int(c.rect.y - cam))))
+
+        player = self.player
+        prev_x, prev_y = player.prev_pos
+        items.append((player.image, (int(prev_x + (player.rect.x - prev_x) * alpha),
+                                     int(prev_y + (player.rect.y - prev_y) * alpha - cam))))
+        return items
+
+    def draw(self, surface, alpha=1.0):
+        cam = self.camera_at(alpha)
+        self.draw_background(surface, cam)
+        particles.draw(surface, alpha, cam)
+        surface.blits(self.draw_items(alpha, cam), False)
+
+
+# Необов'язковий рендерер (--dirty): фон із зірками кешується окремим шаром, а на екран
+# потрапляють лише ділянки, де щось змінилося. Поки камера стоїть, це кілька дрібних
+# прямокутників замість усього вікна; щойно камера зрушила - звичайний повний кадр
+class DirtyRenderer:
+    def __init__(self, screen):
+        self.screen = screen
+        self.layer = Surface((WIDTH, HEIGHT))
+        self.cam = None
+        self.prev_items = {}
+        self.prev_particles = None
+
+    def invalidate(self):
+        self.cam = None
+
+    def draw(self, world, alpha, overlays):
+        screen = self.screen
+        cam = world.camera_at(alpha)
+        items = [(surf, pos, Rect(pos, surf.get_size())) for surf, pos in world.draw_items(alpha, cam) + overlays]
+        current = {(surf, pos): rect for surf, pos, rect in items}
+        particle_rect = particles.bounds(alpha, cam)
+
+        if cam != self.cam:
+            self.cam = cam
+            world.draw_background(self.layer, cam)
+            screen.blit(self.layer, (0, 0))
+            particles.draw(screen, alpha, cam)
+            screen.blits([(surf, pos) for surf, pos, _ in items], False)
+            display.flip()
+        else:
+            # Змінене - це спрайти, яких не було на тому ж місці минулого кадру, і навпаки
+            dirty = [rect for key, rect in current.items() if key not in self.prev_items]
+            dirty += [rect for key, rect in self.prev_items.items() if key not in current]
+            dirty += [r for r in (particle_rect, self.prev_particles) if r is not None]
+
+            for r in dirty:
+                screen.set_clip(r)
+                screen.blit(self.layer, r, r)
+                if particle_rect is not None and particle_rect.colliderect(r):
+                    particles.draw(screen, alpha, cam)
+                screen.blits([(surf, pos) for surf, pos, rect in items if rect.colliderect(r)], False)
+            screen.set_clip(None)
+            display.update(dirty)
+
+        # Старі поверхні тримаємо до наступного кадру, тож порівнювати їх безпечно
+        self.prev_items = current
+        self.prev_particles = particle_rect
+
+
+HUD_POS = (15, 15)
+
+
+# Панель HUD перемальовується в нову поверхню лише коли змінилось якесь значення
+class Hud:
+    def __init__(self, font_ui):
+        self.font = font_ui
+        self.key = None
+        self.surface = None
+
+    def render(self, score, stats):
+        key = (score // 10, stats['coins'], stats['best'])
+        if key != self.key:
+            self.key = key
+            surf = Surface((180, 110), SRCALPHA)
+            draw.rect(surf, (0, 0, 0), (0, 0, 180, 110), border_radius=10)
+            draw.rect(surf, ACCENT_COLOR, (0, 0, 180, 110), 2, border_radius=10)
 
-        last_y -= random.randint(180, 220)
+            surf.blit(render_text(self.font, f"Height: {score // 10}m", WHITE), (10, 7))
+            surf.blit(render_text(self.font, f"Coins: {stats['coins']}", GOLD_COLOR), (10, 32))
+            surf.blit(render_text(self.font, f"Best: {stats['best']}m", (200, 200, 200)), (10, 57))
+            surf.blit(render_text(self.font, f"ESC - Shop", (100, 255, 100)), (10, 82))
+            self.surface = surf
+        return self.surface
 
-    stars = [(random.randint(0, WIDTH), random.randint(0, HEIGHT), random.randint(1, 2)) for _ in range(50)]
+
+def draw_hud(surface, hud, score, stats):
+    surface.blit(hud.render(score, stats), HUD_POS)
+
+
+def game_loop():
+    screen = app.start()
+    clock = app.clock
+    hud = Hud(get_font("Arial", 25, bold=True))
+    renderer = DirtyRenderer(screen) if DIRTY_RECTS else None
+    stats = load_stats()
+    seed = random.getrandbits(32)
+    world = World(stats, seed)
+    recorder = InputRecorder(seed, stats) if RECORD_REPLAYS else None
+    profiler = FrameProfiler()
+    toggle_profiler = False
+    if PROFILE:
+        world.profiler = profiler
+
+    def finish(result):
+        save_stats(world.score // 10, stats)
+        if recorder:
+            recorder.save(world)
+        world.release()
+        return result, world.score
 
     running = True
     paused = False
     waiting_for_revive = False
+    overlay_drawn = False
+    accumulator = 0.0
+    pending_inputs = 0
+    clock.tick()
 
     while running:
         if paused:
-            draw_shop_ui(screen, stats)
-            display.flip()
-            for ev in event.get():
+            if not overlay_drawn:
+                draw_shop_ui(screen, stats)
+                display.flip()
+                overlay_drawn = True
+            for ev in wait_events():
                 if ev.type == QUIT:
-                    save_stats(score // 10, stats)
-                    return "QUIT", score
+                    return finish("QUIT")
                 if ev.type == KEYDOWN:
                     if ev.key == K_ESCAPE:
                         paused = False
-                    if ev.key == K_1:
-                        if stats['coins'] >= 20 and not player.is_flying:
-                            stats['coins'] -= 20
-                            player.activate_jetpack(score)
-                            paused = False
+                    if ev.key == K_1 and world.buy_jetpack():
+                        if recorder:
+                            recorder.event(EV_JETPACK)
+                        paused = False
+            clock.tick()
             continue
 
         if waiting_for_revive:
-            draw_revive_ui(screen, stats)
-            display.flip()
-            for ev in event.get():
+            if not overlay_drawn:
+                draw_revive_ui(screen, stats)
+                display.flip()
+                overlay_drawn = True
+            for ev in wait_events():
                 if ev.type == QUIT:
-                    save_stats(score // 10, stats)
-                    return "QUIT", score
+                    return finish("QUIT")
                 if ev.type == KEYDOWN:
-                    if ev.key == K_y and stats['coins'] >= 25:
-                        stats['coins'] -= 25
+                    if ev.key == K_y and stats['coins'] >= REVIVE_COST:
                         waiting_for_revive = False
-                        player.rect.y = HEIGHT // 2
-                        player.vel_y = -5
-                        player.is_flying = False
-                        for s in spikes:
-                            if abs(s.rect.y - player.rect.y) < 200:
-                                s.kill()
-                    elif ev.key == K_n or (stats['coins'] < 25 and ev.key == K_SPACE):
-                        save_stats(score // 10, stats)
-                        return "GAME_OVER", score
-            continue
-
-        screen.blit(BG_IMG, (0, 0))
-        for s in stars:
-            draw.circle(screen, (100, 100, 120), (s[0], s[1]), s[2])
-
-        keys = key.get_pressed()
-
-        for p in platforms:
-            p.update()
-
-        for s in spikes:
-            s.update()
-
-        for c in coins_group:
-            c.update()
-
-        if sprite.spritecollide(player, coins_group, True):
-            stats['coins'] += 1
-
-        if not player.is_flying and sprite.spritecollide(player, spikes, False):
-            screen.fill(SPIKE_COLOR)
-            display.flip()
-            time.delay(100)
-            waiting_for_revive = True
+                        world.revive()
+                        if recorder:
+                            recorder.event(EV_REVIVE)
+                    elif ev.key == K_n or (stats['coins'] < REVIVE_COST and ev.key == K_SPACE):
+                        return finish("GAME_OVER")
+            clock.tick()
             continue
 
+        if overlay_drawn and renderer:
+            renderer.invalidate()
+        overlay_drawn = False
+
+        # Повільний кадр не сповільнює гру: робимо кілька кроків фізики за кадр
+        accumulator += min(clock.tick(RENDER_FPS), MAX_FRAME_TIME)
+        # F3 перемикає профайлер лише між кадрами, щоб не записати половину кадру
+        if toggle_profiler:
+            world.profiler = None if world.profiler else profiler
+            toggle_profiler = False
+        prof = world.profiler
+        if prof:
+            prof.begin()
+
+        held = read_held_keys()
         for ev in event.get():
             if ev.type == QUIT:
-                save_stats(score // 10, stats)
-                return "QUIT", score
+                return finish("QUIT")
             if ev.type == KEYDOWN:
                 if ev.key == K_SPACE or ev.key == K_w or ev.key == K_UP:
-                    player.jump()
+                    pending_inputs |= IN_JUMP
                 if ev.key == K_ESCAPE:
                     paused = True
+                if ev.key == K_F3:
+                    toggle_profiler = True
+                if ev.key == K_F4 and world.profiler:
+                    print("profile saved to", profiler.export_csv())
+
+        if prof:
+            prof.mark(PH_INPUT)
+
+        state = world.state
+        while accumulator >= PHYSICS_DT:
+            accumulator -= PHYSICS_DT
+            if recorder:
+                recorder.record(held | pending_inputs)
+            state = world.step(held | pending_inputs)
+            pending_inputs = 0
+            if state != "PLAYING":
+                accumulator = 0.0
+                break
+
+        if state == "SPIKE":
+            screen.fill(SPIKE_COLOR)
+            display.flip()
+            time.delay(100)
+            waiting_for_revive = True
+            continue
 
-        player.update(keys, platforms, score)
-
-        target_cam_y = HEIGHT // 2
-
-        if player.rect.y < target_cam_y:
-            diff = target_cam_y - player.rect.y
-            player.rect.y = target_cam_y
-            score += int(diff)
-
-            for c in coins_group:
-                c.rect.y += diff
-                c.start_y += diff
-                if c.rect.y > HEIGHT:
-                    c.kill()
-
-            for p in platforms:
-                p.rect.y += diff
-                p.start_y += diff  # Важливо: оновлюємо стартову позицію для перевірки накладання!
-                if p.rect.y > HEIGHT:
-                    p.kill()
-
-                    # --- НАДІЙНА ГЕНЕРАЦІЯ НОВИХ ПЛАТФОРМ ---
-                    min_y = HEIGHT
-                    for plat in platforms:
-                        if plat.rect.y < min_y:
-                            min_y = plat.rect.y
-
-                    new_spawn_y = min_y - random.randint(180, 220)
-                    new_w = random.randint(30, 90)
-                    new_side = random.choice([0, WIDTH - new_w])
-                    is_moving = random.random() < 0.35
-                    move_range = random.randint(40, 80) if is_moving else 0
-
-                    # Перевіряємо віртуальну зону руху на накладання
-                    if check_platform_overlap(platforms, new_side, new_spawn_y, new_w, 140, move_range):
-                        new_side = 0 if new_side > 0 else WIDTH - new_w  # Міняємо стіну
-
-                        # Якщо навіть протилежна стіна зайнята (дуже рідко), робимо статичною і відсуваємо
-                        if check_platform_overlap(platforms, new_side, new_spawn_y, new_w, 140, move_range):
-                            new_spawn_y -= 150
-                            is_moving = False
-                            move_range = 0
-
-                    new_wall = WallPlatform(new_side, new_spawn_y, width=new_w, moving=is_moving, move_range=move_range)
-                    platforms.add(new_wall)
-
-                    if random.random() < 0.3:
-                        cx = new_side + new_w + 30 if new_side == 0 else new_side - 30
-                        if random.random() < 0.5:
-                            cx = WIDTH // 2
-                        cy = new_spawn_y - random.randint(20, 100)
-                        coins_group.add(Coin(cx, cy))
-
-                    if new_wall.spike_data:
-                        spikes.add(Spike(new_wall, new_wall.spike_data["direction"], new_wall.spike_data["offset"]))
-
-            for s in spikes:
-                if s.wall not in platforms:
-                    s.kill()
-
-            for i in range(len(stars)):
-                stars[i] = (stars[i][0], (stars[i][1] + diff * 0.3) % HEIGHT, stars[i][2])
-
-        for p in particles:
-            p.update()
-            p.draw(screen)
-        particles[:] = [p for p in particles if p.life > 0]
-
-        platforms.draw(screen)
-        spikes.draw(screen)
-        coins_group.draw(screen)
-        screen.blit(player.image, player.rect)
+        alpha = accumulator / PHYSICS_DT
+        if renderer:
+            overlays = [(hud.render(world.score, stats), HUD_POS)]
+            if prof:
+                overlays.append((prof.render(), PROFILE_POS))
+            # display.update всередині рендерера, тож flip тут входить у draw
+            renderer.draw(world, alpha, overlays)
+            if prof:
+                prof.mark(PH_DRAW)
+        else:
+            world.draw(screen, alpha)
+            draw_hud(screen, hud, world.score, stats)
+            if prof:
+                screen.blit(prof.render(), PROFILE_POS)
+                prof.mark(PH_DRAW)
+            display.flip()
+            if prof:
+                prof.mark(PH_FLIP)
+        if prof:
+            prof.end()
 
-        draw.rect(screen, (0, 0, 0), (15, 15, 180, 110), border_radius=10)
-        draw.rect(screen, ACCENT_COLOR, (15, 15, 180, 110), 2, border_radius=10)
+        if state == "FELL":
+            waiting_for_revive = True
 
-        screen.blit(font_ui.render(f"Height: {score // 10}m", True, WHITE), (25, 22))
-        screen.blit(font_ui.render(f"Coins: {stats['coins']}", True, GOLD_COLOR), (25, 47))
-        screen.blit(font_ui.render(f"Best: {stats['best']}m", True, (200, 200, 200)), (25, 72))
-        screen.blit(font_ui.render(f"ESC - Shop", True, (100, 255, 100)), (25, 97))
 
-        if player.rect.top > HEIGHT:
-            waiting_for_revive = True
+# --- HEADLESS ---
+# Політика бота - функція world -> маска IN_*, яку run_headless викликає перед
+# кожним кроком фізики. Стан світу лише читає; стрибок - це IN_JUMP у масці,
+# тож бот проходить через ті самі Player.jump/Player.update, що й гравець
+def wall_kick_policy(world):
+    # Найпростіший бот: летить у бік погляду, відштовхується від кожної стіни
+    # і розвертається біля краю екрана, якщо стіни там немає
+    player = world.player
+    facing_right = player.facing_right
+    if player.rect.right >= WIDTH or player.rect.left <= 0:
+        facing_right = player.rect.left <= 0
+    inputs = IN_RIGHT if facing_right else IN_LEFT
+    if player.on_wall or player.on_ground or (player.vel_y > 2 and player.jumps_left > 0):
+        inputs |= IN_JUMP
+    return inputs
+
+
+# Політики за назвою - batch.py передає у воркери назву, а не саму функцію
+POLICIES = {"wall_kick": wall_kick_policy}
+
+
+def run_headless(frames, policy=wall_kick_policy, stats=None, seed=None):
+    world = World(stats if stats is not None else {"best": 0, "coins": 0}, seed)
+    for _ in range(frames):
+        if world.step(policy(world)) != "PLAYING":
+            break
+    return world
+
+
+# Значення прапорця командного рядка для batch.py і soak.py: --name значення
+def option(name, default, parse=str):
+    if name in sys.argv:
+        return parse(sys.argv[sys.argv.index(name) + 1])
+    return default
+
+
+# --- BATCH PHYSICS ---
+# Player.update і Player.jump для N гравців одночасно на numpy - для перевірки досяжності
+# (наприклад, чи долає стрибок кожен згенерований проміжок) тисяч послідовностей
+# входу за один прохід. Результат побітово збігається зі скалярною версією; частинки
+# і звук пропущено. Стани стіни: 0 - немає, 1 - LEFT, 2 - RIGHT
+WALL_SIDES = {None: 0, "LEFT": 1, "RIGHT": 2}
+
+
+# Rect округлює дробові координати від нуля: 0.5 -> 1, -0.5 -> -1
+def round_coord(v):
+    t = np.trunc(v)
+    return t + np.sign(v) * (np.abs(v - t) >= 0.5)
+
+
+# Знімок стін у порядку групи (у такому ж порядку collide повертає зіткнення).
+# vel - зсув рухомої стіни за крок, тобто dir * speed після її update()
+class WallSet:
+    def __init__(self, platforms):
+        walls = list(platforms)
+        self.walls = walls
+        self.left = np.array([p.rect.left for p in walls], dtype=np.float64)
+        self.top = np.array([p.rect.top for p in walls], dtype=np.float64)
+        self.right = np.array([p.rect.right for p in walls], dtype=np.float64)
+        self.bottom = np.array([p.rect.bottom for p in walls], dtype=np.float64)
+        self.is_floor = np.array([p.is_floor for p in walls], dtype=bool)
+        self.vel = np.array([p.dir * p.speed if p.moving else 0.0 for p in walls], dtype=np.float64)
+
+    def __len__(self):
+        return len(self.walls)
+
+
+class PlayerBatch:
+    def __init__(self, count, player=None):
+        if np is None:
+            raise RuntimeError("PlayerBatch needs numpy")
+        if player is None:
+            player = Player()
+        self.count = count
+        self.w, self.h = player.rect.size
+        self.x = np.full(count, player.rect.x, dtype=np.float64)
+        self.y = np.full(count, player.rect.y, dtype=np.float64)
+        self.vel_x = np.full(count, player.vel_x, dtype=np.float64)
+        self.vel_y = np.full(count, player.vel_y, dtype=np.float64)
+        self.on_wall = np.full(count, WALL_SIDES[player.on_wall], dtype=np.int8)
+        self.facing_right = np.full(count, player.facing_right, dtype=bool)
+        self.jumps_left = np.full(count, player.jumps_left, dtype=np.int64)
+        # Індекс стіни у WallSet; стан між кроками має сенс лише з тим самим набором стін
+        self.attached = np.full(count, -1, dtype=np.int64)
+        self.on_ground = np.full(count, player.on_ground, dtype=bool)
+        self.is_flying = np.full(count, player.is_flying, dtype=bool)
+        self.fly_target_height = np.full(count, player.fly_target_height, dtype=np.float64)
+        self.min_y = self.y.copy()  # найвища точка (найменший y) за весь час
+
+    def overlaps(self, walls):
+        x, y = self.x[:, None], self.y[:, None]
+        return ((x < walls.right) & (x + self.w > walls.left) &
+                (y < walls.bottom) & (y + self.h > walls.top))
+
+    def jump(self, mask=True):
+        mask = mask & ~self.is_flying
+        left = mask & (self.on_wall == 1)
+        right = mask & (self.on_wall == 2)
+        free = mask & (self.on_wall == 0) & (self.on_ground | (self.jumps_left > 0))
+
+        jumped = left | right | free
+        self.vel_y[jumped] = JUMP_Y
+        self.vel_x[left] = JUMP_X
+        self.vel_x[right] = -JUMP_X
+        self.jumps_left[free] = np.where(self.on_ground[free], 1, self.jumps_left[free] - 1)
+
+        self.on_wall[mask] = 0
+        self.attached[mask] = -1
+        self.on_ground[mask] = False
+        return jumped
 
-        display.flip()
-        clock.tick(60)
+    def update(self, inputs, walls, current_score=0):
+        inputs = np.broadcast_to(np.asarray(inputs), (self.count,))
+        in_left = (inputs & IN_LEFT) != 0
+        in_right = (inputs & IN_RIGHT) != 0
+
+        fly = self.is_flying.copy()
+        if fly.any():
+            self.update_flying(fly, in_left, in_right, current_score)
+        g = ~fly
+
+        on_wall = g & (self.on_wall != 0)
+        self.jumps_left[on_wall] = 2
+        self.vel_y[on_wall] = 0
+        self.vel_y[on_wall & ((inputs & IN_UP) != 0)] = -CLIMB_SPEED
+        self.vel_y[on_wall & ((inputs & (IN_UP | IN_DOWN)) == IN_DOWN)] = CLIMB_SPEED
+        carried = on_wall & (self.attached >= 0)
+        if carried.any():
+            self.y[carried] = round_coord(self.y[carried] + walls.vel[self.attached[carried]])
+        falling = g & (self.on_wall == 0)
+        self.vel_y[falling] += GRAVITY
+        self.attached[falling] = -1
+
+        # Обидві клавіші застосовуються по черзі, як у скалярній версії
+        m = g & in_left
+        self.vel_x[m] -= 0.6
+        self.facing_right[m] = False
+        m = g & in_right
+        self.vel_x[m] += 0.6
+        self.facing_right[m] = True
+
+        self.vel_x[g] *= np.where(self.on_ground[g], GROUND_FRICTION, AIR_FRICTION)
+
+        self.x[g] = round_coord(self.x[g] + self.vel_x[g])
+        self.on_wall[g] = 0
+        if len(walls):
+            # Спрацьовує перше не-підлогове зіткнення в порядку стін, далі vel_x уже 0
+            hits = self.overlaps(walls) & ~walls.is_floor
+            first = hits.argmax(axis=1)
+            hit = g & hits.any(axis=1)
+            right = hit & (self.vel_x > 0)
+            left = hit & (self.vel_x < 0)
+            self.x[right] = walls.left[first[right]] - self.w
+            self.x[left] = walls.right[first[left]]
+            self.on_wall[right] = 2
+            self.on_wall[left] = 1
+            self.facing_right[right] = False
+            self.facing_right[left] = True
+            self.attached[right | left] = first[right | left]
+            self.vel_x[right | left] = 0
+
+        self.y[g] = round_coord(self.y[g] + self.vel_y[g])
+        self.on_ground[g] = False
+        if len(walls):
+            hits = self.overlaps(walls)
+            down = g & (self.vel_y > 0)
+            up = g & (self.vel_y < 0)
+            land = hits & down[:, None] & (self.y[:, None] + self.h <= walls.top + 15)
+            bump = hits & up[:, None] & (self.y[:, None] >= walls.bottom - 15)
+            landed = land.any(axis=1)
+            bumped = bump.any(axis=1)
+            self.y[landed] = walls.top[land.argmax(axis=1)[landed]] - self.h
+            self.y[bumped] = walls.bottom[bump.argmax(axis=1)[bumped]]
+            self.vel_y[landed | bumped] = 0
+            self.on_ground[landed] = True
+            self.jumps_left[landed] = 2
+
+        m = g & (self.x < 0)
+        self.x[m] = 0
+        self.vel_x[m] = 0
+        m = g & (self.x + self.w > WIDTH)
+        self.x[m] = WIDTH - self.w
+        self.vel_x[m] = 0
+
+        np.minimum(self.min_y, self.y, out=self.min_y)
+
+    def update_flying(self, fly, in_left, in_right, current_score):
+        self.vel_y[fly] = -15
+        self.vel_x[fly] = 0
+        m = fly & in_left
+        self.vel_x[m] = -9
+        self.facing_right[m] = False
+        m = fly & in_right & ~in_left
+        self.vel_x[m] = 9
+        self.facing_right[m] = True
+
+        self.x[fly] += self.vel_x[fly]
+        self.y[fly] += self.vel_y[fly]
+
+        done = fly & (current_score >= self.fly_target_height)
+        self.is_flying[done] = False
+        self.vel_y[done] = -5
+
+        self.x[fly & (self.x < 0)] = 0
+        self.x[fly & (self.x + self.w > WIDTH)] = WIDTH - self.w
+
+    # Той самий порядок, що й у World.step: стрибок, потім update
+    def step(self, inputs, walls, current_score=0):
+        inputs = np.asarray(inputs)
+        self.jump((inputs & IN_JUMP) != 0)
+        self.update(inputs, walls, current_score)
+
+    # inputs - масив (кроки, гравці) масок IN_*; стіни вважаються нерухомими
+    def run(self, inputs, walls):
+        for row in inputs:
+            self.step(row, walls)
+        return self
+
+
+# --- REPLAY ---
+# Файл повтору: заголовок (seed, монети на старті, кроків, подій, рахунок), далі
+# маски входу по кроках фізики, стиснуті в пари (маска, повторів), і події (крок, код)
+REPLAY_MAGIC = b"WKRP"
+REPLAY_HEADER = struct.Struct("<4sIIIIi")
+REPLAY_RUN = struct.Struct("<BH")
+REPLAY_EVENT = struct.Struct("<IB")
+REPLAY_DIR = "replays"
+
+EV_JETPACK = 1
+EV_REVIVE = 2
+
+
+class InputRecorder:
+    def __init__(self, seed, stats):
+        self.seed = seed
+        self.coins = stats['coins']
+        self.inputs = bytearray()
+        self.events = []
+
+    def record(self, inputs):
+        self.inputs.append(inputs)
+
+    # Подія застосовується перед кроком з номером len(inputs)
+    def event(self, code):
+        self.events.append((len(self.inputs), code))
+
+    def pack(self, score):
+        runs = []
+        for mask in self.inputs:
+            if runs and runs[-1][0] == mask and runs[-1][1] < 0xFFFF:
+                runs[-1][1] += 1
+            else:
+                runs.append([mask, 1])
+        data = [REPLAY_HEADER.pack(REPLAY_MAGIC, self.seed, self.coins, len(runs), len(self.events), score)]
+        data += [REPLAY_RUN.pack(mask, count) for mask, count in runs]
+        data += [REPLAY_EVENT.pack(frame, code) for frame, code in self.events]
+        return b"".join(data)
+
+    def save(self, world, path=None):
+        if path is None:
+            os.makedirs(REPLAY_DIR, exist_ok=True)
+            path = os.path.join(REPLAY_DIR, f"{self.seed:08x}-{world.frame}.wkr")
+        with open(path, "wb") as f:
+            f.write(self.pack(world.score))
+        return path
+
+
+class Replay:
+    def __init__(self, data):
+        magic, self.seed, self.coins, runs, events, self.score = REPLAY_HEADER.unpack_from(data)
+        if magic != REPLAY_MAGIC:
+            raise ValueError("not a replay file")
+        offset = REPLAY_HEADER.size
+        self.inputs = bytearray()
+        for mask, count in REPLAY_RUN.iter_unpack(data[offset:offset + runs * REPLAY_RUN.size]):
+            self.inputs += bytes((mask,)) * count
+        offset += runs * REPLAY_RUN.size
+        self.events = list(REPLAY_EVENT.iter_unpack(data[offset:offset + events * REPLAY_EVENT.size]))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return cls(f.read())
+
+
+# Програє запис через World.step без вікна і без пауз між кадрами.
+# Рахунок, що не збігся із записаним, означає розсинхрон фізики
+def run_replay(replay):
+    world = World({"best": 0, "coins": replay.coins}, replay.seed)
+    events = deque(replay.events)
+    for frame, inputs in enumerate(replay.inputs):
+        while events and events[0][0] == frame:
+            code = events.popleft()[1]
+            if code == EV_REVIVE:
+                world.revive()
+            elif code == EV_JETPACK:
+                world.buy_jetpack()
+        world.step(inputs)
+    return world
 
 
 def main_menu():
-    if os.path.exists("Hero-Immortal.ogg"):
-        mixer.music.load("Hero-Immortal.ogg")
-        mixer.music.set_volume(0.5)
-        mixer.music.play(-1)
+    screen = app.start()
+    loader = AssetLoader()
+    loader.start()
+    audio.play_music()
 
     state = "MENU"
     last_score = 0
     stats = load_stats()
 
-    title_font = font.SysFont("Arial", 45, bold=True)
-    sub_font = font.SysFont("Arial", 25)
-    info_font = font.SysFont("Arial", 20)
+    title_font = get_font("Arial", 45, bold=True)
+    sub_font = get_font("Arial", 25)
+    info_font = get_font("Arial", 20)
+    shown = None
 
     while state != "QUIT":
-        screen.blit(BG_IMG, (0, 0))
+        if loader.poll():
+            shown = None
+        screen.blit(res.bg, (0, 0))
 
         if state == "MENU":
-            stats = load_stats()
-            title_shadow = title_font.render("WALL KICKER", True, (0, 0, 0))
+            title_shadow = render_text(title_font, "WALL KICKER", (0, 0, 0))
             screen.blit(title_shadow, (WIDTH // 2 - title_shadow.get_width() // 2 + 3, HEIGHT // 3 + 3))
 
-            title = title_font.render("WALL KICKER", True, ACCENT_COLOR)
+            title = render_text(title_font, "WALL KICKER", ACCENT_COLOR)
             screen.blit(title, (WIDTH // 2 - title.get_width() // 2, HEIGHT // 3))
 
-            record = sub_font.render(f"Record: {stats['best']}m", True, (200, 200, 200))
+            record = render_text(sub_font, f"Record: {stats['best']}m", (200, 200, 200))
             screen.blit(record, (WIDTH // 2 - record.get_width() // 2, HEIGHT // 2 - 40))
 
-            coins_info = info_font.render(f"Total Coins: {stats['coins']}", True, GOLD_COLOR)
+            coins_info = render_text(info_font, f"Total Coins: {stats['coins']}", GOLD_COLOR)
             screen.blit(coins_info, (WIDTH // 2 - coins_info.get_width() // 2, HEIGHT // 2 - 10))
 
-            hint = sub_font.render("Press SPACE to Start", True, WHITE)
+            hint = render_text(sub_font, "Press SPACE to Start", WHITE)
+            hint_rect = hint.get_rect(topleft=(WIDTH // 2 - hint.get_width() // 2, HEIGHT // 2 + 50))
 
             if (time.get_ticks() // 500) % 2 == 0:
-                screen.blit(hint, (WIDTH // 2 - hint.get_width() // 2, HEIGHT // 2 + 50))
+                screen.blit(hint, hint_rect)
 
         elif state == "GAME_OVER":
-            title = title_font.render("GAME OVER", True, SPIKE_COLOR)
+            title = render_text(title_font, "GAME OVER", SPIKE_COLOR)
             screen.blit(title, (WIDTH // 2 - title.get_width() // 2, HEIGHT // 3))
 
-            score_text = sub_font.render(f"You climbed: {last_score // 10}m", True, WHITE)
+            score_text = render_text(sub_font, f"You climbed: {last_score // 10}m", WHITE)
             screen.blit(score_text, (WIDTH // 2 - score_text.get_width() // 2, HEIGHT // 2))
 
-            coins_text = info_font.render(f"Coins: {stats['coins']}", True, GOLD_COLOR)
+            coins_text = render_text(info_font, f"Coins: {stats['coins']}", GOLD_COLOR)
             screen.blit(coins_text, (WIDTH // 2 - coins_text.get_width() // 2, HEIGHT // 2 + 30))
 
-            hint = sub_font.render("Press SPACE to Retry", True, (150, 150, 150))
-            screen.blit(hint, (WIDTH // 2 - hint.get_width() // 2, HEIGHT // 2 + 80))
+            hint = render_text(sub_font, "Press SPACE to Retry", (150, 150, 150))
+            hint_rect = hint.get_rect(topleft=(WIDTH // 2 - hint.get_width() // 2, HEIGHT // 2 + 80))
+            screen.blit(hint, hint_rect)
 
-        display.flip()
+        if not loader.finished:
+            draw_loading_bar(screen, loader)
 
-        for ev in event.get():
+        # Поки екран той самий, змінюється лише підказка, що блимає
+        if DIRTY_RECTS and shown == state:
+            display.update(hint_rect)
+        else:
+            display.flip()
+            shown = state
+
+        # У меню блимає підказка, тож прокидаємось на кожне її перемикання
+        timeout = 500 - time.get_ticks() % 500 if state == "MENU" else None
+        if not loader.finished:
+            timeout = min(timeout or LOADING_POLL, LOADING_POLL)
+        for ev in wait_events(timeout):
             if ev.type == QUIT:
                 state = "QUIT"
             if ev.type == KEYDOWN:
                 if ev.key == K_SPACE:
                     if state == "MENU" or state == "GAME_OVER":
+                        loader.wait()
                         result, score = game_loop()
+                        shown = None
                         if result == "QUIT":
                             state = "QUIT"
                         else:
                             state = "GAME_OVER"
                             last_score = score
-                            stats = load_stats()
+    stats_store.close()
     quit()
 
 
 if __name__ == "__main__":
-    main_menu()
\ No newline at end of file
+    if "--replay" in sys.argv:
+        init()
+        for path in sys.argv[sys.argv.index("--replay") + 1:]:
+            if path.startswith("--"):
+                break
+            replay = Replay.load(path)
+            started = time.get_ticks()
+            world = run_replay(replay)
+            elapsed = max(1, time.get_ticks() - started)
+            status = "ok" if world.score == replay.score else f"DESYNC (recorded {replay.score})"
+            print(f"{path}: {world.frame} frames in {elapsed} ms "
+                  f"({world.frame * 1000 // elapsed} FPS), score {world.score}, {status}")
+    elif HEADLESS:
+        args = sys.argv[sys.argv.index("--headless") + 1:]
+        frames = int(args[0]) if args and args[0].isdigit() else 10000
+        seed = int(sys.argv[sys.argv.index("--seed") + 1]) if "--seed" in sys.argv else None
+        total_frames, games, best = 0, 0, 0
+        init()
+        started = time.get_ticks()
+        while total_frames < frames:
+            world = run_headless(frames - total_frames, seed=seed)
+            seed = seed + 1 if seed is not None else None
+            total_frames += world.frame
+            games += 1
+            best = max(best, world.score // 10)
+        elapsed = max(1, time.get_ticks() - started)
+        print(f"{total_frames} frames, {games} games in {elapsed} ms "
+              f"({total_frames * 1000 // elapsed} FPS), best {best}m")
+    else:
+        main_menu()
\ No newline at end of file
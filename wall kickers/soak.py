@@ -0,0 +1,138 @@
+import os
+import sys
+
+# Тривалий прогін для кіоск-збірок: бот грає N годин ігрового часу на повній швидкості,
+# з перезапусками гри і відродженнями, як у game_loop. Періодично знімає tracemalloc
+# і рахує поверхні, групи та кеші; падає, якщо пам'ять після розігріву виросла більше
+# за поріг. Запуск:
+#   python soak.py [годин] [--interval хвилин] [--threshold-kb KB] [--seed S] [--no-draw]
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import gc
+import tracemalloc
+from time import perf_counter
+from pygame import Surface
+
+import main
+from main import PHYSICS_DT, World, Hud, get_font, draw_hud, wall_kick_policy, option
+
+WARMUP_MINUTES = 5  # кеші й пули заповнюються, від цього знімка рахуємо приріст
+TOP_STATS = 10
+
+
+# Surface не відстежується gc, тож шукаємо поверхні серед того, на що посилаються
+# відстежувані об'єкти (спрайти, словники кешів, списки)
+def count_surfaces():
+    seen = set()
+    for obj in gc.get_objects():
+        for ref in gc.get_referents(obj):
+            if isinstance(ref, Surface):
+                seen.add(id(ref))
+    return len(seen)
+
+
+# Власні алокації харнесу (рядки звіту) і tracemalloc у приріст не рахуємо
+def take_snapshot():
+    gc.collect()
+    return tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, tracemalloc.__file__),
+    ])
+
+
+def sample(world, frames, elapsed):
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    return {
+        "minutes": frames * PHYSICS_DT / 60000,
+        "frames": frames,
+        "seconds": elapsed,
+        "traced_kb": current // 1024,
+        "peak_kb": peak // 1024,
+        "surfaces": count_surfaces(),
+        "particles": len(main.particles),
+        "platforms": len(world.platforms),
+        "spikes": len(world.spikes),
+        "coins": len(world.coins_group),
+        "pools": len(main.wall_pool) + len(main.spike_pool) + len(main.coin_pool),
+        "wall_surfaces": len(main.wall_surfaces),
+        "texts": len(main.text_cache),
+    }
+
+
+COLUMNS = ["minutes", "traced_kb", "peak_kb", "surfaces", "particles", "platforms",
+           "spikes", "coins", "pools", "wall_surfaces", "texts"]
+
+
+def report(row):
+    print("".join(f"{row[c]:>14.1f}" if c == "minutes" else f"{row[c]:>14}" for c in COLUMNS), flush=True)
+
+
+def run():
+    args = [a for a in sys.argv[1:2] if not a.startswith("--")]
+    hours = float(args[0]) if args else 1.0
+    interval = option("--interval", 5.0, float)
+    threshold = option("--threshold-kb", 512, int)
+    seed = option("--seed", 0, int)
+    drawing = "--no-draw" not in sys.argv
+    total = int(hours * 3600 * 1000 / PHYSICS_DT)
+    every = int(interval * 60 * 1000 / PHYSICS_DT)
+    warmup = int(WARMUP_MINUTES * 60 * 1000 / PHYSICS_DT)
+    # Звіт кожні every кадрів: нульовий чи від'ємний інтервал зламав би frame % every
+    if every < 1:
+        print(f"--interval must be at least one physics step ({PHYSICS_DT / 60000:.5f} min)")
+        return 2
+
+    screen = main.app.start()
+    hud = Hud(get_font("Arial", 25, bold=True))
+    stats = {"best": 0, "coins": 0}
+
+    tracemalloc.start()
+    world = World(stats, seed)
+    baseline = None
+    games = 0
+    started = perf_counter()
+    print("".join(f"{c:>14}" for c in COLUMNS))
+
+    for frame in range(1, total + 1):
+        state = world.step(wall_kick_policy(world))
+        if state != "PLAYING":
+            # Як гравець: відроджується, поки є монети, інакше нова гра з новими групами
+            if stats['coins'] >= main.REVIVE_COST:
+                world.revive()
+            else:
+                games += 1
+                stats['best'] = max(stats['best'], world.score // 10)
+                world.release()
+                world = World(stats, seed + games)
+        if drawing:
+            world.draw(screen, 1.0)
+            draw_hud(screen, hud, world.score, stats)
+
+        if frame == warmup:
+            baseline = take_snapshot()
+        if frame % every == 0 or frame == total:
+            report(sample(world, frame, perf_counter() - started))
+
+    elapsed = perf_counter() - started
+    print(f"{total} frames ({hours:g} h of game time), {games} restarts in {elapsed:.0f} s")
+    if baseline is None:
+        print(f"run shorter than the {WARMUP_MINUTES} min warm-up, nothing to compare")
+        return 0
+
+    final = take_snapshot()
+    diff = final.compare_to(baseline, "lineno")
+    growth = sum(stat.size_diff for stat in diff) // 1024
+    print(f"retained growth since warm-up: {growth} KB (threshold {threshold} KB)")
+    for stat in diff[:TOP_STATS]:
+        print("  ", stat)
+    if growth > threshold:
+        print("FAIL: memory keeps growing")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())